@@ -0,0 +1,69 @@
+"""Per-operation latency of the mmcli backend vs. the D-Bus backend.
+
+The mmcli backend runs bench/fake_mmcli.py; the D-Bus backend talks to
+bench/mock_modemmanager.py on a private session bus started by this script.
+Both fakes answer instantly, so the numbers show the per-call overhead of
+each transport (process spawn + JSON vs. one D-Bus round trip). Needs
+jeepney and dbus-daemon.
+
+Usage: python3 bench/bench_backends.py [repeat]
+"""
+import os
+import subprocess
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..'))
+import mmclisms
+
+def start_bus():
+    daemon = subprocess.Popen(['dbus-daemon', '--session', '--nofork', '--print-address=1'],
+                              stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    address = daemon.stdout.readline().strip()
+    service = subprocess.Popen([sys.executable, os.path.join(HERE, 'mock_modemmanager.py'), '--bus', address],
+                               stdout=subprocess.PIPE, text=True)
+    service.stdout.readline()  # wait until the name is owned
+    return address, [service, daemon]
+
+def operations(backend):
+    modem = backend.list_modems()[0]
+    sms = backend.list_sms(modem)[0]
+    return [
+        ('list', lambda: backend.list_modems()),
+        ('info', lambda: backend.modem_info(modem)),
+        ('enable', lambda: backend.set_enabled(modem, True)),
+        ('list-sms', lambda: backend.list_sms(modem)),
+        ('read', lambda: backend.read_sms(sms)),
+        ('create+send', lambda: backend.send_sms(backend.create_sms(modem, '+48500000000', 'bench'))),
+    ]
+
+def measure(backend, repeat):
+    results = {}
+    for name, op in operations(backend):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            op()
+        results[name] = (time.perf_counter() - start) / repeat * 1000
+    return results
+
+def main_bench():
+    os.environ['MMCLISMS_MMCLI_STATS'] = ''  # keep fake mmcli timings out of ./mmclisms.db.mmcli-stats.json
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    mmclisms.mmcli_bin = os.path.join(HERE, 'fake_mmcli.py')
+    mmcli = measure(mmclisms.MmcliBackend(), repeat)
+    address, procs = start_bus()
+    try:
+        backend = mmclisms.DbusBackend(address)
+        dbus = measure(backend, repeat)
+        backend.close()
+    finally:
+        for p in procs:
+            p.terminate()
+            p.wait()
+    print(f"{'operation':<12} {'mmcli ms':>10} {'dbus ms':>10} {'speedup':>8}")
+    for name in mmcli:
+        print(f"{name:<12} {mmcli[name]:10.3f} {dbus[name]:10.3f} {mmcli[name] / dbus[name]:7.0f}x")
+
+if __name__ == '__main__':
+    main_bench()
@@ -0,0 +1,47 @@
+"""Sustained messages/minute of send_bulk against a fake mmcli.
+
+The fake mmcli is a shell script whose `--send` sleeps for a fixed time, like
+a modem transmitting, so the numbers show how worker threads overlap sends
+and how a per-modem rate limit caps throughput.
+
+Usage: python3 bench/bench_bulk.py [messages] [send_delay_seconds]
+"""
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import mmclisms
+
+FAKE_MMCLI = '''#!/bin/sh
+case "$*" in
+  *-L*) echo '{"modem-list": ["/org/freedesktop/ModemManager1/Modem/0"]}' ;;
+  *--messaging-create-sms*) echo 'Successfully created new SMS: /org/freedesktop/ModemManager1/SMS/1' ;;
+  *--send*) sleep %s; echo 'successfully sent the SMS' ;;
+  *) echo '{"modem": {"generic": {"own-numbers": ["+48600000000"], "state": "enabled", "signal-quality": {"value": "75"}}}}' ;;
+esac
+'''
+
+def main_bench():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    delay = sys.argv[2] if len(sys.argv) > 2 else '0.1'
+    items = [(f'+4850000{i:04d}', f'bulk message {i}') for i in range(n)]
+    with tempfile.TemporaryDirectory() as tmp:
+        mmclisms.mmcli_bin = os.path.join(tmp, 'mmcli')
+        with open(mmclisms.mmcli_bin, 'w') as f:
+            f.write(FAKE_MMCLI % delay)
+        os.chmod(mmclisms.mmcli_bin, 0o755)
+        mmclisms.modem_backend = 'mmcli'
+        mmclisms.database = os.path.join(tmp, 'bench.db')
+        os.environ['MMCLISMS_MMCLI_STATS'] = ''  # tmp is gone by the time they would be saved
+        mmclisms.create_schema()
+        print(f"{n} messages, {delay}s per send")
+        print(f"{'workers':>8} {'modem rate':>11} {'msg/min':>10} {'failed':>7}")
+        for workers, rate in ((1, None), (2, None), (4, None), (8, None), (16, None), (8, 20.0)):
+            summary = mmclisms.send_bulk(items, workers, modem_rate=rate, pool=mmclisms.ModemPool(), progress=False)
+            print(f"{workers:8d} {rate or '-':>11} {summary['per_minute']:10.0f} {summary['failed']:7d}")
+        mmclisms.close_history_writer()
+        mmclisms.close_db()
+
+if __name__ == '__main__':
+    main_bench()
@@ -0,0 +1,64 @@
+"""Latency of queueing an SMS through the daemon vs. starting Python per message.
+
+Starts `main.py serve` against bench/fake_mmcli.py in a temporary directory,
+sends requests over one persistent DaemonClient connection and prints the
+p50/p99 round trip of 'send' and 'send_batch'. For comparison it times
+starting an interpreter that imports main, the floor for any per-message
+process.
+
+Usage: python3 bench/bench_daemon.py [requests]
+"""
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..'))
+import mmclisms
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+def report(label, samples):
+    print(f"{label:<22} p50 {percentile(samples, 0.5) * 1000:8.3f} ms  p99 {percentile(samples, 0.99) * 1000:8.3f} ms")
+
+def main_bench():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'mmclisms.sock')
+        env = dict(os.environ, MMCLISMS_MMCLI=os.path.join(HERE, 'fake_mmcli.py'), MMCLISMS_BACKEND='mmcli')
+        daemon = subprocess.Popen([sys.executable, os.path.join(HERE, '..', 'main.py'), 'serve', '--socket', path],
+                                  cwd=tmp, env=env, stdout=subprocess.PIPE, text=True)
+        try:
+            while not daemon.stdout.readline().startswith('Listening'):
+                pass
+            with mmclisms.DaemonClient(path) as d:
+                samples = []
+                for i in range(n):
+                    start = time.perf_counter()
+                    d.request('send', tel=f'+4850000{i:04d}', text='daemon bench')
+                    samples.append(time.perf_counter() - start)
+                report(f'send ({n})', samples)
+                batch = [{'tel': f'+4851000{i:04d}', 'text': 'daemon bench'} for i in range(100)]
+                samples = []
+                for _ in range(max(1, n // 100)):
+                    start = time.perf_counter()
+                    d.request('send_batch', messages=batch)
+                    samples.append(time.perf_counter() - start)
+                report('send_batch (100 msgs)', samples)
+                print(f"outbox: {d.request('outbox')['counts']}")
+        finally:
+            daemon.terminate()
+            daemon.wait()
+        samples = []
+        for _ in range(5):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, '-c', 'import mmclisms'], cwd=os.path.join(HERE, '..'), check=True)
+            samples.append(time.perf_counter() - start)
+        report('python -c "import mmclisms"', samples)
+
+if __name__ == '__main__':
+    main_bench()
@@ -0,0 +1,59 @@
+"""Benchmark the one-row-per-number history table against the old append-only one.
+
+Builds an old-style history table with a million rows, times get_history and
+add_history on it, migrates it with migrate_history() and times them again.
+
+Usage: python3 bench/bench_history_schema.py [rows] [distinct_numbers]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import mmclisms
+
+OLD_DDL = "CREATE TABLE history (id INTEGER PRIMARY KEY AUTOINCREMENT, tel VARCHAR(30) NOT NULL, last_message TIMESTAMP NOT NULL);"
+
+def timed(label, fn, repeat=1):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    elapsed = (time.perf_counter() - start) / repeat
+    print(f"  {label:<38} {elapsed * 1000:10.2f} ms")
+    return result
+
+def measure(label):
+    print(label)
+    rows = timed('get_history (full)', mmclisms.get_history)
+    print(f"  {'rows returned':<38} {len(rows):10d}")
+    timed('first page (LIMIT 20)', lambda: mmclisms.query_db("SELECT * FROM history ORDER BY last_message DESC LIMIT 20;"), repeat=20)
+    timed('add_history (1 row, synchronous)', lambda: mmclisms.insert_history_rows([(f"+48{random.randrange(10**8)}", datetime.now().isoformat())]), repeat=200)
+
+def main_bench():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    numbers = int(sys.argv[2]) if len(sys.argv) > 2 else 50_000
+    with tempfile.TemporaryDirectory() as tmp:
+        mmclisms.database = os.path.join(tmp, 'bench.db')
+        conn = mmclisms.get_db()
+        conn.execute(OLD_DDL)
+        start = datetime(2024, 1, 1)
+        rng = random.Random(1)
+        with conn:
+            conn.executemany(
+                "INSERT INTO history (tel, last_message) VALUES (?, ?);",
+                ((f"+48{500000000 + rng.randrange(numbers)}", (start + timedelta(seconds=i)).isoformat()) for i in range(n)))
+        print(f"{n} history rows over {numbers} numbers")
+        # the old add_history appended rows
+        main_insert = mmclisms.insert_history_rows
+        mmclisms.insert_history_rows = lambda rows: mmclisms.query_db("INSERT INTO history (tel, last_message) VALUES (?, ?);", rows[0])
+        measure('append-only table')
+        mmclisms.insert_history_rows = main_insert
+        timed('migrate_history', mmclisms.migrate_history)
+        measure('one row per number')
+        mmclisms.close_db()
+
+if __name__ == '__main__':
+    main_bench()
@@ -0,0 +1,45 @@
+"""Compare HistoryIndex lookups with LIKE queries on a large history table.
+
+Usage: python3 bench/bench_history_search.py [numbers]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import mmclisms
+
+QUERIES = ['+4850', '12345', '7777', '99999999', '+49']
+
+def per_call_ms(fn, repeat=20):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - start) / repeat * 1000, len(result)
+
+def main_bench():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    rng = random.Random(1)
+    with tempfile.TemporaryDirectory() as tmp:
+        mmclisms.database = os.path.join(tmp, 'bench.db')
+        mmclisms.create_schema()
+        conn = mmclisms.get_db()
+        with conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO history (tel, last_message) VALUES (?, ?);",
+                ((f"+48{rng.randrange(500000000, 900000000)}", f"2024-01-01T00:00:{i % 60:02d}") for i in range(n)))
+        start = time.perf_counter()
+        index = mmclisms.get_history_index()
+        print(f"{len(index)} numbers, index built in {time.perf_counter() - start:.2f}s")
+        print(f"{'query':<10} {'index ms':>10} {'hits':>5} {'LIKE ms':>10} {'hits':>5}")
+        for q in QUERIES:
+            idx_ms, idx_hits = per_call_ms(lambda: index.search(q, 20))
+            like_ms, like_hits = per_call_ms(
+                lambda: conn.execute("SELECT tel FROM history WHERE tel LIKE ? LIMIT 20;", ('%' + q + '%',)).fetchall(), repeat=3)
+            print(f"{q:<10} {idx_ms:10.3f} {idx_hits:5d} {like_ms:10.3f} {like_hits:5d}")
+        mmclisms.close_db()
+
+if __name__ == '__main__':
+    main_bench()
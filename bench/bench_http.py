@@ -0,0 +1,85 @@
+"""Load test of the daemon's HTTP API against bench/fake_mmcli.py.
+
+Starts `main.py serve --http PORT` in a temporary directory, then keeps
+`connections` keep-alive connections busy with POST /sms (and a GET /inbox
+every tenth request) for `requests` requests in total. Prints p50/p99
+latency and throughput per endpoint, then how far the outbox got.
+
+Usage: python3 bench/bench_http.py [requests] [connections]
+"""
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+async def call(reader, writer, method, path, body=None):
+    payload = json.dumps(body).encode() if body is not None else b''
+    writer.write(f"{method} {path} HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n"
+                 f"Content-Length: {len(payload)}\r\n\r\n".encode() + payload)
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while (line := await reader.readline()) != b'\r\n':
+        name, _, value = line.decode().partition(':')
+        if name.lower() == 'content-length':
+            length = int(value)
+    return status, json.loads(await reader.readexactly(length))
+
+async def client(port, counter, total, samples):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    while counter[0] < total:
+        i = counter[0]
+        counter[0] += 1
+        if i % 10 == 9:
+            endpoint, args = 'GET /inbox', ('GET', '/inbox?since=0&limit=20')
+        else:
+            endpoint, args = 'POST /sms', ('POST', '/sms', {'tel': f'+4850000{i:04d}', 'text': 'http bench'})
+        start = time.perf_counter()
+        status, reply = await call(reader, writer, *args)
+        samples.setdefault(endpoint, []).append(time.perf_counter() - start)
+        assert status in (200, 202) and reply['ok'], reply
+    writer.close()
+
+async def load(port, total, connections):
+    counter, samples = [0], {}
+    start = time.perf_counter()
+    await asyncio.gather(*(client(port, counter, total, samples) for _ in range(connections)))
+    elapsed = time.perf_counter() - start
+    print(f"{total} requests over {connections} connections in {elapsed:.2f}s, {total / elapsed:.0f} req/s")
+    for endpoint, values in sorted(samples.items()):
+        values.sort()
+        print(f"{endpoint:<10} n={len(values):<6} p50 {values[len(values) // 2] * 1000:7.2f} ms"
+              f"  p99 {values[min(len(values) - 1, int(len(values) * 0.99))] * 1000:7.2f} ms")
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    print(f"outbox: {(await call(reader, writer, 'GET', '/outbox'))[1]['counts']}")
+    writer.close()
+
+def main_bench():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    connections = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+    port = free_port()
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, MMCLISMS_MMCLI=os.path.join(HERE, 'fake_mmcli.py'), MMCLISMS_BACKEND='mmcli')
+        daemon = subprocess.Popen([sys.executable, os.path.join(HERE, '..', 'main.py'), 'serve',
+                                   '--socket', os.path.join(tmp, 'mmclisms.sock'), '--http', str(port)],
+                                  cwd=tmp, env=env, stdout=subprocess.PIPE, text=True)
+        try:
+            while not daemon.stdout.readline().startswith('HTTP API'):
+                pass
+            asyncio.run(load(port, total, connections))
+        finally:
+            daemon.terminate()
+            daemon.wait()
+
+if __name__ == '__main__':
+    main_bench()
@@ -0,0 +1,69 @@
+"""Inbound latency from an incoming SMS to its row in the database, using watch_inbox.
+
+Starts a private session bus with bench/mock_modemmanager.py, injects
+messages through the mock's Receive method (which emits Messaging.Added) and
+measures the time until watch_inbox has committed each one. Needs jeepney
+and dbus-daemon.
+
+Usage: python3 bench/bench_inbox_latency.py [messages] [interval_seconds]
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..'))
+import mmclisms
+from bench_backends import start_bus
+from jeepney import DBusAddress, new_method_call
+from jeepney.io.blocking import open_dbus_connection
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+def main_bench():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    interval = float(sys.argv[2]) if len(sys.argv) > 2 else 0.01
+    address, procs = start_bus()
+    injected, committed = {}, {}
+    done = threading.Event()
+
+    def on_message(m):
+        committed[m['text']] = time.perf_counter()
+        if len(committed) == n:
+            done.set()
+
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            mmclisms.database = os.path.join(tmp, 'bench.db')
+            mmclisms.dbus_bus = address
+            mmclisms.modem_backend = 'dbus'
+            mmclisms.create_schema()
+            watch = mmclisms.watch_inbox('0', on_message)
+            injector = open_dbus_connection(bus=address)
+            modem = DBusAddress(f'{mmclisms.DbusBackend.root}/Modem/0', bus_name=mmclisms.DbusBackend.service,
+                                interface='org.freedesktop.ModemManager1.Mock')
+            for i in range(n):
+                text = f'latency probe {i}'
+                injected[text] = time.perf_counter()
+                injector.send_and_get_reply(new_method_call(modem, 'Receive', 'ss', ('+48500000000', text)))
+                time.sleep(interval)
+            done.wait(30)
+            watch.stop()
+            injector.close()
+            mmclisms.close_backend()
+            mmclisms.close_db()
+    finally:
+        for p in procs:
+            p.terminate()
+            p.wait()
+    latencies = [(committed[t] - injected[t]) * 1000 for t in committed]
+    print(f"{len(latencies)}/{n} messages stored")
+    if latencies:
+        print(f"signal -> DB row  p50 {percentile(latencies, 50):.2f} ms  p99 {percentile(latencies, 99):.2f} ms  max {max(latencies):.2f} ms")
+
+if __name__ == '__main__':
+    main_bench()
@@ -0,0 +1,72 @@
+"""How much of reading an inbox is JSON parsing, per decoder.
+
+Decodes `mmcli -s PATH --output-json` output from bench/fake_mmcli.py with
+the old str + json.loads + parse_sms path and with every decoder
+open_json_decoder knows that is installed (json, orjson, msgspec structs),
+and compares the parse time with the time an SMS read takes: through the
+fake mmcli as a subprocess (serial and at sms_read_concurrency), and
+in-process, where only main.py's own work is left.
+
+Usage: python3 bench/bench_json_decode.py [messages] [repeat]
+"""
+import json
+import os
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..'))
+import mmclisms
+import fake_mmcli
+
+def per_message_us(fn, items, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for item in items:
+            fn(*item)
+    return (time.perf_counter() - start) / (repeat * len(items)) * 1e6
+
+def old_decode(path, out):
+    # MmcliBackend.read_sms before the decoder layer: text=True output, then json.loads
+    return mmclisms.parse_sms(path, json.loads(out.decode()))
+
+def main_bench():
+    os.environ['MMCLISMS_MMCLI_STATS'] = ''  # keep fake mmcli timings out of ./mmclisms.db.mmcli-stats.json
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    fake = fake_mmcli.FakeMmcli(inbox=n)
+    paths = [f'{fake_mmcli.ROOT}/SMS/{i}' for i in range(n)]
+    outputs = [(p, (fake.answer('read', ['-s', p, '--output-json']) + '\n').encode()) for p in paths]
+
+    parse = {'json.loads(str) (old)': per_message_us(old_decode, outputs, repeat)}
+    for name in ('json', 'orjson', 'msgspec'):
+        decoder = mmclisms.open_json_decoder(name)
+        if decoder[0] != name:
+            print(f"{name}: not installed")
+            continue
+        mmclisms._json = decoder
+        assert mmclisms.decode_sms(*outputs[0])['text'] == old_decode(*outputs[0])['text']
+        parse[name + (' structs' if decoder[2] else '')] = per_message_us(mmclisms.decode_sms, outputs, repeat)
+    mmclisms._json = None
+
+    mmclisms.mmcli_bin = os.path.join(HERE, 'fake_mmcli.py')
+    reads = {}
+    for label, concurrency in (('spawn, serial', 1), (f'spawn, {mmclisms.sms_read_concurrency} at once', mmclisms.sms_read_concurrency)):
+        start = time.perf_counter()
+        mmclisms.MmcliBackend().read_sms_many(paths, concurrency)
+        reads[label] = (time.perf_counter() - start) / n * 1e6
+    backend = fake_mmcli.backend(fake)
+    reads['in-process'] = per_message_us(backend.read_sms, [(p,) for p in paths], max(1, repeat // 10))
+
+    print(f"{n} messages, {len(outputs[0][1])} bytes of JSON each, decoder in use: {mmclisms.get_json_decoder()[0]}")
+    print(f"{'read':<28} {'us/msg':>10}")
+    for label, us in reads.items():
+        print(f"{label:<28} {us:10.1f}")
+    print()
+    print(f"{'decoder':<28} {'us/msg':>10} {'speedup':>8}" + ''.join(f" {'% of ' + label:>24}" for label in reads))
+    base = parse['json.loads(str) (old)']
+    for name, us in parse.items():
+        print(f"{name:<28} {us:10.2f} {base / us:7.1f}x" + ''.join(f" {us / r * 100:23.2f}%" for r in reads.values()))
+
+if __name__ == '__main__':
+    main_bench()
@@ -0,0 +1,51 @@
+"""Outbox enqueue rate, one message per transaction vs. enqueue_many, and concurrent claiming.
+
+The claim part drains the queue from several threads with claim_outbox and
+checks that no message was handed out twice.
+
+Usage: python3 bench/bench_outbox.py [messages] [workers]
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import mmclisms
+
+def main_bench():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    items = [(f'+4850000{i:04d}', f'outbox message {i}') for i in range(n)]
+    with tempfile.TemporaryDirectory() as tmp:
+        mmclisms.database = os.path.join(tmp, 'bench.db')
+        mmclisms.create_schema()
+        print(f"{n} messages, profile {mmclisms.db_profile}")
+        start = time.perf_counter()
+        for tel, text in items:
+            mmclisms.enqueue_sms(tel, text)
+        print(f"enqueue_sms   {n / (time.perf_counter() - start):10.0f} msg/s")
+        start = time.perf_counter()
+        for i in range(0, n, 500):
+            mmclisms.enqueue_many(items[i:i + 500])
+        print(f"enqueue_many  {n / (time.perf_counter() - start):10.0f} msg/s")
+
+        claimed = []
+        def claim():
+            worker = mmclisms.outbox_worker_id()
+            while rows := mmclisms.claim_outbox(worker, limit=10):
+                claimed.extend(row['id'] for row in rows)
+        threads = [threading.Thread(target=claim) for _ in range(workers)]
+        start = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - start
+        print(f"claim ({workers} threads) {len(claimed) / elapsed:6.0f} msg/s, "
+              f"{len(claimed)} claimed, {len(claimed) - len(set(claimed))} duplicates")
+        mmclisms.close_db()
+
+if __name__ == '__main__':
+    main_bench()
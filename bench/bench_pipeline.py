@@ -0,0 +1,52 @@
+"""Serial create+send vs. the two-stage SmsPipeline on one modem.
+
+The fake mmcli sleeps on --messaging-create-sms and on --send, standing in
+for a modem that handles one operation of each kind at a time. Prints
+throughput and the pipeline's stage latency and queue depth metrics.
+
+Usage: python3 bench/bench_pipeline.py [messages] [create_delay] [send_delay]
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import mmclisms
+
+FAKE_MMCLI = '''#!/bin/sh
+case "$*" in
+  *--messaging-create-sms*) sleep %s; echo 'Successfully created new SMS: /org/freedesktop/ModemManager1/SMS/1' ;;
+  *--send*) sleep %s; echo 'successfully sent the SMS' ;;
+esac
+'''
+
+def main_bench():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    create_delay = sys.argv[2] if len(sys.argv) > 2 else '0.05'
+    send_delay = sys.argv[3] if len(sys.argv) > 3 else '0.1'
+    items = [(f'+4850000{i:04d}', f'pipeline message {i}') for i in range(n)]
+    with tempfile.TemporaryDirectory() as tmp:
+        mmclisms.mmcli_bin = os.path.join(tmp, 'mmcli')
+        with open(mmclisms.mmcli_bin, 'w') as f:
+            f.write(FAKE_MMCLI % (create_delay, send_delay))
+        os.chmod(mmclisms.mmcli_bin, 0o755)
+        mmclisms.modem_backend = 'mmcli'
+        mmclisms.database = os.path.join(tmp, 'bench.db')
+        os.environ['MMCLISMS_MMCLI_STATS'] = ''  # tmp is gone by the time they would be saved
+        mmclisms.create_schema()
+        print(f"{n} messages, create {create_delay}s, send {send_delay}s")
+        start = time.monotonic()
+        for tel, text in items:
+            mmclisms.deliver_sms('0', tel, text)
+        serial = n / (time.monotonic() - start) * 60
+        print(f"serial     {serial:8.0f} msg/min")
+        for depth in (1, 4, 16):
+            summary = mmclisms.send_pipelined(items, ['0'], depth=depth, progress=False)
+            print(f"depth {depth:<4} {summary['per_minute']:8.0f} msg/min  ({summary['per_minute'] / serial:.2f}x)")
+        mmclisms.print_pipeline_metrics(summary['pipelines'])
+        mmclisms.close_history_writer()
+        mmclisms.close_db()
+
+if __name__ == '__main__':
+    main_bench()
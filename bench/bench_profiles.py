@@ -0,0 +1,34 @@
+"""Measure add_history inserts/sec under each database durability profile.
+
+Usage: python3 bench/bench_profiles.py [inserts]
+"""
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import mmclisms
+
+def bench_profile(profile, n, tmp):
+    mmclisms.close_db()
+    mmclisms.database = os.path.join(tmp, f'{profile}.db')
+    mmclisms.db_profile = profile
+    mmclisms.history_write_behind = False
+    mmclisms.create_schema()
+    start = time.perf_counter()
+    for i in range(n):
+        mmclisms.add_history(f"+48{500000000 + i}", datetime.now().isoformat())
+    elapsed = time.perf_counter() - start
+    mmclisms.close_db()
+    print(f"{profile:<9} {n / elapsed:10.0f} inserts/s  {elapsed / n * 1e6:8.1f} us/insert")
+
+def main_bench():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    with tempfile.TemporaryDirectory() as tmp:
+        for profile in mmclisms.db_profiles:
+            bench_profile(profile, n, tmp)
+
+if __name__ == '__main__':
+    main_bench()
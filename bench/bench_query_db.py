@@ -0,0 +1,48 @@
+"""Compare per-insert latency of the old connect-per-call query_db with the pooled one.
+
+Usage: python3 bench/bench_query_db.py [inserts]
+"""
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import mmclisms
+
+DDL = "CREATE TABLE IF NOT EXISTS history (id INTEGER PRIMARY KEY AUTOINCREMENT, tel VARCHAR(30) NOT NULL, last_message TIMESTAMP NOT NULL);"
+INSERT = "INSERT INTO history (tel, last_message) VALUES (?, ?);"
+
+def old_query_db(query, args=()):
+    # query_db as it was before the connection pool: connect, execute, commit, close
+    conn = sqlite3.connect(mmclisms.database)
+    cur = conn.cursor()
+    cur.execute(query, args)
+    conn.commit()
+    lastrowid = cur.lastrowid
+    conn.close()
+    return lastrowid
+
+def run(label, fn, n):
+    start = time.perf_counter()
+    for i in range(n):
+        fn(INSERT, (f"+48{500000000 + i}", datetime.now().isoformat()))
+    elapsed = time.perf_counter() - start
+    print(f"{label:<10} {n} inserts  {elapsed:.3f}s  {elapsed / n * 1e6:8.1f} us/insert")
+    return elapsed
+
+def main_bench():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    with tempfile.TemporaryDirectory() as tmp:
+        mmclisms.database = os.path.join(tmp, 'bench.db')
+        old_query_db(DDL)
+        old = run('old', old_query_db, n)
+        mmclisms.query_db(DDL)
+        new = run('pooled', mmclisms.query_db, n)
+        mmclisms.close_db()
+    print(f"speedup: {old / new:.1f}x")
+
+if __name__ == '__main__':
+    main_bench()
@@ -0,0 +1,54 @@
+"""Wall-clock time of reading an inbox serially vs. with read_sms_many at several concurrency levels.
+
+Runs against a fake mmcli that sleeps before answering each `-s PATH --output-json`.
+
+Usage: python3 bench/bench_sms_fetch.py [messages] [delay_seconds]
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import mmclisms
+
+FAKE_MMCLI = '''#!/bin/sh
+sleep %s
+printf '{"sms": {"dbus-path": "%%s", "content": {"number": "+48500000000", "text": "hello"}, "properties": {"state": "received", "timestamp": "2024-05-10T12:00:00+02:00"}}}\\n' "$2"
+'''
+
+def serial(paths):
+    # the check_received_sms loop before read_sms_many
+    out = []
+    for p in paths:
+        r = subprocess.run([mmclisms.mmcli_bin, '-s', p, '--output-json'], capture_output=True, text=True, check=True)
+        out.append(mmclisms.parse_sms(p, json.loads(r.stdout)))
+    return out
+
+def timed(label, fn):
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<16} {elapsed:8.3f}s")
+    return elapsed
+
+def main_bench():
+    os.environ['MMCLISMS_MMCLI_STATS'] = ''  # keep fake mmcli timings out of ./mmclisms.db.mmcli-stats.json
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    delay = sys.argv[2] if len(sys.argv) > 2 else '0.05'
+    paths = [f"/org/freedesktop/ModemManager1/SMS/{i}" for i in range(n)]
+    with tempfile.TemporaryDirectory() as tmp:
+        mmclisms.mmcli_bin = os.path.join(tmp, 'mmcli')
+        with open(mmclisms.mmcli_bin, 'w') as f:
+            f.write(FAKE_MMCLI % delay)
+        os.chmod(mmclisms.mmcli_bin, 0o755)
+        print(f"{n} messages, {delay}s per mmcli read")
+        base = timed('serial', lambda: serial(paths))
+        for c in (1, 2, 4, 8, 16, 32):
+            t = timed(f'concurrency {c}', lambda: mmclisms.read_sms_many(paths, c))
+            print(f"{'':<16} {base / t:7.1f}x")
+
+if __name__ == '__main__':
+    main_bench()
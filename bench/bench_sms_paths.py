@@ -0,0 +1,63 @@
+"""Extracting SMS paths from a large --messaging-list-sms listing: old recursive walker vs. extract_sms_paths.
+
+Times the known {"modem": {"messaging": {"sms": [...]}}} shape and an
+unknown shape that goes through the iterative fallback, and checks that
+all three return the same paths. The walker also fails on deeply nested
+output that the fallback handles.
+
+Usage: python3 bench/bench_sms_paths.py [entries]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import mmclisms
+
+def collect_paths(data):
+    # MmcliBackend.list_sms before extract_sms_paths
+    sms_paths = []
+
+    def collect(obj):
+        if isinstance(obj, dict):
+            for v in obj.values():
+                collect(v)
+        elif isinstance(obj, list):
+            for item in obj:
+                if isinstance(item, str) and item.startswith('/org/freedesktop/ModemManager1/SMS/'):
+                    sms_paths.append(item)
+                else:
+                    collect(item)
+    collect(data)
+    return sms_paths
+
+def per_call_ms(fn, data, repeat=50):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn(data)
+    return (time.perf_counter() - start) / repeat * 1000, result
+
+def main_bench():
+    os.environ['MMCLISMS_MMCLI_STATS'] = ''  # keep fake mmcli timings out of ./mmclisms.db.mmcli-stats.json
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    paths = [f'{mmclisms.SMS_PATH_PREFIX}{i}' for i in range(n)]
+    known = {'modem': {'dbus-path': '/org/freedesktop/ModemManager1/Modem/0', 'messaging': {'sms': paths}}}
+    unknown = {'messages': [{'path': p, 'refs': [p]} for p in paths]}
+    print(f"{n} SMS paths")
+    print(f"{'shape':<10} {'walker ms':>10} {'extract ms':>11} {'speedup':>8}")
+    for label, data in (('known', known), ('unknown', unknown)):
+        old_ms, old = per_call_ms(collect_paths, data)
+        new_ms, new = per_call_ms(mmclisms.extract_sms_paths, data)
+        assert old == new, label
+        print(f"{label:<10} {old_ms:10.3f} {new_ms:11.3f} {old_ms / new_ms:7.1f}x")
+    deep = [paths[0]]
+    for _ in range(sys.getrecursionlimit() * 2):
+        deep = [deep]
+    try:
+        collect_paths(deep)
+        print("walker handled deep nesting")
+    except RecursionError:
+        print(f"walker: RecursionError at depth {sys.getrecursionlimit() * 2}, extract: {mmclisms.extract_sms_paths(deep)}")
+
+if __name__ == '__main__':
+    main_bench()
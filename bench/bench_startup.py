@@ -0,0 +1,53 @@
+"""Cold-start cost of one-shot commands: wall time and `python -X importtime` totals.
+
+Runs each command several times in a temporary directory holding an
+initialized database and prints the best wall time, the total time spent
+importing and the most expensive top-level imports. No modem is needed:
+the commands measured do not touch the backend.
+
+Usage: python3 bench/bench_startup.py [repeat]
+"""
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+MAIN = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'main.py')
+COMMANDS = [
+    ['-c', 'pass'],
+    [MAIN, '--help'],
+    [MAIN, 'history', '--limit', '1', '--json'],
+    [MAIN, 'outbox', 'status'],
+]
+
+def import_times(cmd, cwd):
+    """Return (total import microseconds, [(cumulative us, module)] of top-level imports)."""
+    err = subprocess.run([sys.executable, '-X', 'importtime', *cmd], cwd=cwd, capture_output=True, text=True).stderr
+    total, top = 0, []
+    for line in err.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative, name = line[len('import time:'):].split('|')
+        total += int(self_us)
+        if not name.startswith('  '):  # imported by the program itself, not by another module
+            top.append((int(cumulative), name.strip()))
+    return total, sorted(top, reverse=True)[:5]
+
+def main_bench():
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    with tempfile.TemporaryDirectory() as tmp:
+        subprocess.run([sys.executable, MAIN, 'history'], cwd=tmp, capture_output=True, check=True)
+        for cmd in COMMANDS:
+            best = float('inf')
+            for _ in range(repeat):
+                start = time.perf_counter()
+                subprocess.run([sys.executable, *cmd], cwd=tmp, capture_output=True, check=True)
+                best = min(best, time.perf_counter() - start)
+            total, top = import_times(cmd, tmp)
+            label = ' '.join(os.path.basename(c) if c == MAIN else c for c in cmd)
+            print(f"{label:<32} {best * 1000:7.1f} ms wall, {total / 1000:6.1f} ms importing")
+            print('    ' + ', '.join(f"{name} {us / 1000:.1f}" for us, name in top))
+
+if __name__ == '__main__':
+    main_bench()
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""Stand-in for mmcli that answers the commands main.py runs, without a modem.
+
+Point main.py at it with MMCLISMS_MMCLI=bench/fake_mmcli.py, or use
+backend() to run the same fake inside the process (no spawn per call).
+
+Behaviour is set with environment variables (or FakeMmcli arguments):
+
+    FAKE_MMCLI_LATENCY       seconds per call, optionally per operation:
+                             '0.05' or '0.01,send=0.5,create=0.1'
+    FAKE_MMCLI_FAILURE_RATE  probability that a call fails with exit status 1
+    FAKE_MMCLI_INBOX         SMS listed by --messaging-list-sms (default 3)
+    FAKE_MMCLI_MODEMS        modems listed by -L (default 1)
+    FAKE_MMCLI_SEED          seed for the failure draws (reproducible in-process;
+                             the executable mixes in its pid, as it draws once)
+
+Operations: list, info, enable, create, send, list-sms, read, delete.
+"""
+import json
+import os
+import random
+import sys
+import time
+
+ROOT = '/org/freedesktop/ModemManager1'
+
+def parse_latency(spec):
+    """Turn '0.01,send=0.5' into {None: 0.01, 'send': 0.5}."""
+    latency = {None: 0.0}
+    for part in filter(None, (spec or '').split(',')):
+        op, _, value = part.rpartition('=')
+        latency[op or None] = float(value)
+    return latency
+
+def operation(args):
+    """Name the operation an mmcli command line performs, or None if unsupported."""
+    if '-L' in args:
+        return 'list'
+    if '--messaging-list-sms' in args:
+        return 'list-sms'
+    if any(a.startswith('--messaging-create-sms') for a in args):
+        return 'create'
+    if any(a.startswith('--messaging-delete-sms') for a in args):
+        return 'delete'
+    if '--enable' in args or '--disable' in args:
+        return 'enable'
+    if args[:1] == ['-s']:
+        return 'send' if '--send' in args else 'read'
+    if args[:1] == ['-m']:
+        return 'info'
+    return None
+
+class FakeMmcli:
+    def __init__(self, latency=None, failure_rate=0.0, inbox=3, modems=1, seed=None):
+        self.latency = latency if isinstance(latency, dict) else {None: float(latency or 0)}
+        self.failure_rate = failure_rate
+        self.inbox = inbox
+        self.modems = modems
+        self.random = random.Random(seed)
+        self.next_sms = inbox
+
+    @classmethod
+    def from_env(cls, environ=os.environ):
+        seed = environ.get('FAKE_MMCLI_SEED')
+        return cls(parse_latency(environ.get('FAKE_MMCLI_LATENCY')),
+                   float(environ.get('FAKE_MMCLI_FAILURE_RATE', '0')),
+                   int(environ.get('FAKE_MMCLI_INBOX', '3')),
+                   int(environ.get('FAKE_MMCLI_MODEMS', '1')),
+                   int(seed) if seed else None)
+
+    def run(self, args):
+        """Answer one mmcli command line. Returns (exit status, stdout, stderr)."""
+        op = operation(args)
+        if op is None:
+            return 1, '', f'error: unsupported arguments: {" ".join(args)}\n'
+        delay = self.latency.get(op, self.latency[None])
+        if delay:
+            time.sleep(delay)
+        if self.failure_rate and self.random.random() < self.failure_rate:
+            return 1, '', f'error: fake {op} failure\n'
+        return 0, self.answer(op, args) + '\n', ''
+
+    def answer(self, op, args):
+        if op == 'list':
+            return json.dumps({'modem-list': [f'{ROOT}/Modem/{m}' for m in range(self.modems)]})
+        if op == 'list-sms':
+            return json.dumps({'modem': {'messaging': {'sms': [f'{ROOT}/SMS/{i}' for i in range(self.inbox)]}}})
+        if op == 'create':
+            self.next_sms += 1
+            return f'Successfully created new SMS: {ROOT}/SMS/{self.next_sms}'
+        if op == 'delete':
+            return 'successfully deleted SMS from modem'
+        if op == 'enable':
+            return 'successfully ' + ('enabled' if '--enable' in args else 'disabled') + ' the modem'
+        if op == 'send':
+            return 'successfully sent the SMS'
+        if op == 'read':
+            n = args[1].rsplit('/', 1)[1]
+            return json.dumps({'sms': {
+                'dbus-path': args[1],
+                'content': {'number': f'+4850000{int(n):04d}', 'text': f'fake message {n}', 'data': '--'},
+                'properties': {'state': 'received', 'timestamp': '2025-01-01T12:00:00+00:00', 'storage': 'me'},
+            }})
+        return json.dumps({'modem': {'dbus-path': f'{ROOT}/Modem/{args[1]}', 'generic': {
+            'own-numbers': ['+48600000000'], 'state': 'enabled', 'signal-quality': {'value': '75', 'recent': 'yes'},
+        }}})
+
+def backend(fake=None):
+    """Return a mmclisms.MmcliBackend that asks `fake` (default: from the environment) instead of running mmcli.
+
+    Output parsing and error handling are main.py's own, only the process
+    spawn is skipped. read_sms_many reads serially.
+    """
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+    import mmclisms
+
+    fake = fake or FakeMmcli.from_env()
+
+    class InProcessBackend(mmclisms.MmcliBackend):
+        name = 'fake'
+
+        def _run(self, args, text=True):
+            import subprocess
+            code, out, err = fake.run([str(a) for a in args])
+            if code:
+                e = subprocess.CalledProcessError(code, [mmclisms.mmcli_bin, *args], out, err)
+                raise mmclisms.ModemError(f"mmcli error: {e}", out, err)
+            if not text:
+                out, err = out.encode(), err.encode()
+            return subprocess.CompletedProcess([mmclisms.mmcli_bin, *args], code, out, err)
+
+        def read_sms_many(self, paths, concurrency):
+            results = []
+            for p in paths:
+                try:
+                    results.append((p, self.read_sms(p), None))
+                except mmclisms.ModemError as e:
+                    results.append((p, None, str(e)))
+            return results
+
+    return InProcessBackend()
+
+def main(argv):
+    fake = FakeMmcli.from_env()
+    fake.random.seed(f"{os.environ.get('FAKE_MMCLI_SEED')}:{os.getpid()}")
+    code, out, err = fake.run(argv[1:])
+    sys.stdout.write(out)
+    sys.stderr.write(err)
+    return code
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,144 @@
+"""Mock ModemManager D-Bus service for running DbusBackend without hardware.
+
+Implements the parts of org.freedesktop.ModemManager1 that main.py uses:
+ObjectManager.GetManagedObjects, Properties.GetAll/Get, Modem.Enable,
+Modem.Messaging.Create/List/Delete, Sms.Send and the Messaging.Added and
+Properties.PropertiesChanged signals.
+Needs jeepney.
+
+Incoming messages are faked by calling Receive(number, text) on a modem path
+with the org.freedesktop.ModemManager1.Mock interface, or with --emit-every,
+which delivers one message every N seconds. Both emit Messaging.Added.
+
+Usage:
+    dbus-daemon --session --print-address --fork   # or use an existing session bus
+    python3 bench/mock_modemmanager.py [--modems N] [--inbox N] [--emit-every SECONDS]
+    MMCLISMS_BACKEND=dbus MMCLISMS_DBUS_BUS=SESSION python3 main.py
+"""
+import argparse
+import time
+
+from jeepney import DBusAddress, HeaderFields, MessageType, new_error, new_method_return, new_signal
+from jeepney.bus_messages import message_bus
+from jeepney.io.blocking import open_dbus_connection
+
+SERVICE = 'org.freedesktop.ModemManager1'
+ROOT = '/org/freedesktop/ModemManager1'
+MODEM = SERVICE + '.Modem'
+MESSAGING = SERVICE + '.Modem.Messaging'
+SMS = SERVICE + '.Sms'
+MOCK = SERVICE + '.Mock'
+PROPERTIES = 'org.freedesktop.DBus.Properties'
+
+MODEM_ENABLED, MODEM_DISABLED = 6, 3
+SMS_STORED, SMS_RECEIVED, SMS_SENT = 1, 3, 5
+
+class MockModemManager:
+    def __init__(self, modems=1, inbox=3):
+        self.modems = {}
+        self.sms = {}
+        self.next_sms = 0
+        for m in range(modems):
+            self.modems[str(m)] = {'State': MODEM_ENABLED, 'OwnNumbers': [f'+4860000{m:04d}'], 'SignalQuality': (75, True), 'sms': []}
+            for i in range(inbox):
+                self.add_sms(str(m), f'+4850000{i:04d}', f'mock message {i}', SMS_RECEIVED)
+
+    def add_sms(self, modem_id, number, text, state):
+        path = f'{ROOT}/SMS/{self.next_sms}'
+        self.next_sms += 1
+        self.sms[path] = {'Number': number, 'Text': text, 'State': state, 'Timestamp': time.strftime('%Y-%m-%dT%H:%M:%S+00:00', time.gmtime()), 'modem': modem_id}
+        self.modems[modem_id]['sms'].append(path)
+        return path
+
+    def added_signal(self, modem_id, sms_path):
+        emitter = DBusAddress(f'{ROOT}/Modem/{modem_id}', interface=MESSAGING)
+        return new_signal(emitter, 'Added', 'ob', (sms_path, True))
+
+    def modem_props(self, modem_id):
+        m = self.modems[modem_id]
+        return {'State': ('i', m['State']), 'OwnNumbers': ('as', m['OwnNumbers']), 'SignalQuality': ('(ub)', m['SignalQuality'])}
+
+    def sms_props(self, path):
+        s = self.sms[path]
+        return {'Number': ('s', s['Number']), 'Text': ('s', s['Text']), 'State': ('u', s['State']), 'Timestamp': ('s', s['Timestamp'])}
+
+    def properties(self, path, interface):
+        if path.startswith(ROOT + '/Modem/') and interface == MODEM:
+            return self.modem_props(path.rsplit('/', 1)[1])
+        if path in self.sms and interface == SMS:
+            return self.sms_props(path)
+        raise KeyError(path)
+
+    def handle(self, msg):
+        """Return the reply to a method call, or (reply, signals) when signals must follow it."""
+        fields = msg.header.fields
+        path, iface, member = fields.get(HeaderFields.path), fields.get(HeaderFields.interface), fields.get(HeaderFields.member)
+        modem_id = path.rsplit('/', 1)[1] if path.startswith(ROOT + '/Modem/') else None
+        try:
+            if member == 'Ping':
+                return new_method_return(msg)
+            if member == 'GetManagedObjects':
+                objects = {f'{ROOT}/Modem/{m}': {MODEM: self.modem_props(m), MESSAGING: {}} for m in self.modems}
+                return new_method_return(msg, 'a{oa{sa{sv}}}', (objects,))
+            if iface == PROPERTIES and member == 'GetAll':
+                return new_method_return(msg, 'a{sv}', (self.properties(path, msg.body[0]),))
+            if iface == PROPERTIES and member == 'Get':
+                return new_method_return(msg, 'v', (self.properties(path, msg.body[0])[msg.body[1]],))
+            if iface == MODEM and member == 'Enable':
+                self.modems[modem_id]['State'] = MODEM_ENABLED if msg.body[0] else MODEM_DISABLED
+                changed = new_signal(DBusAddress(path, interface=PROPERTIES), 'PropertiesChanged', 'sa{sv}as',
+                                     (MODEM, {'State': ('i', self.modems[modem_id]['State'])}, []))
+                return new_method_return(msg), [changed]
+            if iface == MESSAGING and member == 'Create':
+                props = msg.body[0]
+                sms_path = self.add_sms(modem_id, props['number'][1], props['text'][1], SMS_STORED)
+                return new_method_return(msg, 'o', (sms_path,))
+            if iface == MESSAGING and member == 'List':
+                return new_method_return(msg, 'ao', (self.modems[modem_id]['sms'],))
+            if iface == MESSAGING and member == 'Delete':
+                sms_path = msg.body[0]
+                del self.sms[sms_path]
+                self.modems[modem_id]['sms'].remove(sms_path)
+                return new_method_return(msg)
+            if iface == SMS and member == 'Send':
+                self.sms[path]['State'] = SMS_SENT
+                return new_method_return(msg)
+            if iface == MOCK and member == 'Receive':
+                sms_path = self.add_sms(modem_id, msg.body[0], msg.body[1], SMS_RECEIVED)
+                return new_method_return(msg, 'o', (sms_path,)), [self.added_signal(modem_id, sms_path)]
+        except (KeyError, ValueError):
+            return new_error(msg, SERVICE + '.Error.Core.NotFound', 's', (f'no such object: {path}',))
+        return new_error(msg, 'org.freedesktop.DBus.Error.UnknownMethod', 's', (f'{iface}.{member} not implemented',))
+
+def serve(bus, mm, emit_every=None):
+    conn = open_dbus_connection(bus=bus)
+    conn.send_and_get_reply(message_bus.RequestName(SERVICE))
+    print(f"mock ModemManager on {bus} bus with {len(mm.modems)} modem(s)", flush=True)
+    next_emit = time.monotonic() + emit_every if emit_every else None
+    while True:
+        try:
+            msg = conn.receive(timeout=max(0, next_emit - time.monotonic()) if next_emit else None)
+        except TimeoutError:
+            modem_id = next(iter(mm.modems))
+            sms_path = mm.add_sms(modem_id, '+48500009999', f'periodic message {mm.next_sms}', SMS_RECEIVED)
+            conn.send(mm.added_signal(modem_id, sms_path))
+            next_emit += emit_every
+            continue
+        if msg.header.message_type == MessageType.method_call:
+            reply = mm.handle(msg)
+            reply, signals = reply if isinstance(reply, tuple) else (reply, [])
+            conn.send(reply)
+            for signal in signals:
+                conn.send(signal)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--bus', default='SESSION')
+    parser.add_argument('--modems', type=int, default=1)
+    parser.add_argument('--inbox', type=int, default=3)
+    parser.add_argument('--emit-every', type=float, help='deliver an incoming SMS every N seconds')
+    args = parser.parse_args()
+    serve(args.bus, MockModemManager(args.modems, args.inbox), args.emit_every)
+
+if __name__ == '__main__':
+    main()
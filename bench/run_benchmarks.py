@@ -0,0 +1,143 @@
+"""End-to-end benchmark suite against the fake mmcli, with JSON output.
+
+Runs send_sms, check_received_sms, get_modem_info and the history
+functions against bench/fake_mmcli.py, either in-process (no spawn, shows
+main.py's own overhead) or as a subprocess like the real mmcli, and prints
+one JSON document with per-benchmark latency statistics. Save it and pass
+it to --compare on a later commit to see what changed.
+
+Usage:
+    python3 bench/run_benchmarks.py [--backend inprocess|mmcli] [--repeat N]
+        [--latency SPEC] [--failure-rate P] [--inbox N] [--history N]
+        [--seed N] [--output FILE] [--compare BASE.json]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..'))
+import mmclisms
+import fake_mmcli
+
+def stats(samples, failures=0):
+    samples = sorted(samples)
+    n = len(samples)
+    pick = lambda p: samples[min(n - 1, int(n * p))] * 1000
+    return {'n': n, 'failures': failures, 'mean_ms': sum(samples) / n * 1000, 'min_ms': samples[0] * 1000,
+            'p50_ms': pick(0.5), 'p90_ms': pick(0.9), 'p99_ms': pick(0.99), 'max_ms': samples[-1] * 1000}
+
+def measure(fn, repeat, setup=None):
+    """Time fn() repeat times; a falsy return value counts as a failure."""
+    samples, failures = [], 0
+    for i in range(repeat):
+        if setup:
+            setup()
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            ok = fn(i)
+            samples.append(time.perf_counter() - start)
+        failures += ok is False or ok is None
+    return stats(samples, failures)
+
+def forget_inbox():
+    mmclisms.query_db("DELETE FROM sms_seen;")
+    mmclisms.query_db("DELETE FROM messages WHERE direction = 'in';")
+
+def run(args):
+    results = {}
+    rng = random.Random(args.seed)
+    results['get_modem_info (uncached)'] = measure(lambda i: mmclisms.get_modem_info('0'), args.repeat,
+                                                   setup=mmclisms.invalidate_modem_status)
+    results['get_modem_info (cached)'] = measure(lambda i: mmclisms.get_modem_info('0'), args.repeat)
+    results['send_sms'] = measure(lambda i: mmclisms.send_sms('0', f'+4860{i:07d}', 'benchmark message'), args.repeat)
+    results['check_received_sms (all new)'] = measure(lambda i: mmclisms.check_received_sms('0'), args.repeat,
+                                                      setup=forget_inbox)
+    results['check_received_sms (none new)'] = measure(lambda i: mmclisms.check_received_sms('0'), args.repeat)
+
+    mmclisms.insert_history_rows([(f'+48{rng.randrange(500000000, 900000000)}', f'2024-01-01T00:00:{i % 60:02d}')
+                              for i in range(args.history)])
+    results['add_history'] = measure(lambda i: mmclisms.add_history(f'+4870{i:07d}', time.strftime('%Y-%m-%dT%H:%M:%S')) or True,
+                                     args.repeat)
+    mmclisms.flush_history()
+    results['get_history'] = measure(lambda i: mmclisms.get_history(), max(1, args.repeat // 10))
+    results['get_history_page'] = measure(lambda i: mmclisms.get_history_page(20), args.repeat)
+    results['search_history'] = measure(lambda i: mmclisms.search_history(str(rng.randrange(1000, 9999))) or True, args.repeat)
+    return results
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=HERE, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(base, current):
+    print(f"{'benchmark':<32} {'base p50':>10} {'p50':>10} {'change':>8}", file=sys.stderr)
+    for name, r in current['results'].items():
+        b = base['results'].get(name)
+        if not b:
+            continue
+        change = (r['p50_ms'] / b['p50_ms'] - 1) * 100 if b['p50_ms'] else 0.0
+        print(f"{name:<32} {b['p50_ms']:10.3f} {r['p50_ms']:10.3f} {change:+7.1f}%", file=sys.stderr)
+
+def main_bench():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--backend', choices=['inprocess', 'mmcli'], default='inprocess')
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--latency', default='0', help="fake mmcli latency, e.g. '0.01,send=0.2'")
+    parser.add_argument('--failure-rate', type=float, default=0.0)
+    parser.add_argument('--inbox', type=int, default=20)
+    parser.add_argument('--history', type=int, default=10000, help='history rows loaded before the history benchmarks')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='write the JSON here instead of stdout')
+    parser.add_argument('--compare', help='JSON from an earlier run to compare p50 latencies with')
+    args = parser.parse_args()
+
+    config = {'FAKE_MMCLI_LATENCY': args.latency, 'FAKE_MMCLI_FAILURE_RATE': str(args.failure_rate),
+              'FAKE_MMCLI_INBOX': str(args.inbox), 'FAKE_MMCLI_SEED': str(args.seed)}
+    with tempfile.TemporaryDirectory() as tmp:
+        mmclisms.database = os.path.join(tmp, 'bench.db')
+        os.environ['MMCLISMS_MMCLI_STATS'] = ''  # tmp is gone by the time they would be saved
+        mmclisms.create_schema()
+        if args.backend == 'mmcli':
+            os.environ.update(config)
+            mmclisms.mmcli_bin = os.path.join(HERE, 'fake_mmcli.py')
+            mmclisms.modem_backend = 'mmcli'
+        else:
+            mmclisms._backend = fake_mmcli.backend(fake_mmcli.FakeMmcli.from_env(config))
+        results = run(args)
+        mmclisms.close_history_writer()
+        mmclisms.close_db()
+
+    report = {
+        'commit': git_commit(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'db_profile': mmclisms.db_profile,
+        'config': {'backend': args.backend, 'repeat': args.repeat, 'latency': args.latency,
+                   'failure_rate': args.failure_rate, 'inbox': args.inbox, 'history': args.history, 'seed': args.seed},
+        'results': results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
+
+if __name__ == '__main__':
+    main_bench()
@@ -0,0 +1,3365 @@
+import sqlite3
+import os
+import json
+import threading
+import atexit
+import sys
+import time
+import bisect
+import itertools
+from array import array
+from datetime import datetime
+# Everything else is imported where it is used, so that a one-shot command
+# only pays for the modules its path needs (see bench/bench_startup.py).
+
+database = 'mmclisms.db'
+
+# Durability profiles applied to every new connection. "safe" fsyncs on every
+# commit, "balanced" only at WAL checkpoints, "fast" leaves syncing to the OS.
+db_profiles = {
+    'safe': {
+        'journal_mode': 'WAL', 'synchronous': 'FULL', 'mmap_size': 0,
+        'cache_size': -2000, 'temp_store': 'DEFAULT',
+        'wal_autocheckpoint': 1000, 'checkpoint_on_close': 'TRUNCATE',
+    },
+    'balanced': {
+        'journal_mode': 'WAL', 'synchronous': 'NORMAL', 'mmap_size': 64 * 1024 * 1024,
+        'cache_size': -8000, 'temp_store': 'MEMORY',
+        'wal_autocheckpoint': 1000, 'checkpoint_on_close': 'TRUNCATE',
+    },
+    'fast': {
+        'journal_mode': 'WAL', 'synchronous': 'OFF', 'mmap_size': 256 * 1024 * 1024,
+        'cache_size': -32000, 'temp_store': 'MEMORY',
+        'wal_autocheckpoint': 10000, 'checkpoint_on_close': 'PASSIVE',
+    },
+}
+db_profile = os.environ.get('MMCLISMS_DB_PROFILE', 'balanced')
+
+# History rows are written behind the send path in batches of up to
+# history_batch_size rows, or every history_flush_interval seconds.
+history_write_behind = os.environ.get('MMCLISMS_HISTORY_WRITE_BEHIND', '1') != '0'
+history_batch_size = int(os.environ.get('MMCLISMS_HISTORY_BATCH', '100'))
+history_flush_interval = float(os.environ.get('MMCLISMS_HISTORY_FLUSH_INTERVAL', '1.0'))
+
+# mmcli executable, and how many `mmcli -s` reads may run at once.
+mmcli_bin = os.environ.get('MMCLISMS_MMCLI', 'mmcli')
+sms_read_concurrency = int(os.environ.get('MMCLISMS_SMS_READ_CONCURRENCY', '8'))
+# Decoder for mmcli's JSON output: 'msgspec', 'orjson', 'json' or 'auto' (the
+# first of those that is installed). With msgspec, SMS reads decode straight
+# into structs holding only the fields that are stored.
+json_decoder = os.environ.get('MMCLISMS_JSON_DECODER', 'auto')
+
+# How to talk to ModemManager: 'mmcli', 'dbus' (needs jeepney) or 'auto',
+# which uses D-Bus when it is reachable and falls back to mmcli.
+modem_backend = os.environ.get('MMCLISMS_BACKEND', 'auto')
+dbus_bus = os.environ.get('MMCLISMS_DBUS_BUS', 'SYSTEM')
+# The mmcli backend cannot subscribe to new messages and polls this often instead.
+inbox_poll_interval = float(os.environ.get('MMCLISMS_INBOX_POLL_INTERVAL', '5'))
+# Seconds a modem status read is reused before asking the modem again.
+modem_info_ttl = float(os.environ.get('MMCLISMS_MODEM_INFO_TTL', '30'))
+# How ModemPool spreads sends: 'round_robin', 'least_loaded' or 'quota', and
+# the optional number of sends each SIM may make per pool_quota_period seconds.
+pool_strategy = os.environ.get('MMCLISMS_POOL_STRATEGY', 'round_robin')
+pool_quota = int(os.environ['MMCLISMS_POOL_QUOTA']) if os.environ.get('MMCLISMS_POOL_QUOTA') else None
+pool_quota_period = float(os.environ.get('MMCLISMS_POOL_QUOTA_PERIOD', '86400'))
+
+# Bulk sending: worker threads, and optional messages/second limits per modem
+# and per carrier. Carriers are found by number prefix, e.g.
+# MMCLISMS_CARRIER_PREFIXES='{"+4850": "orange", "+4860": "plus"}'.
+bulk_workers = int(os.environ.get('MMCLISMS_BULK_WORKERS', '4'))
+bulk_modem_rate = float(os.environ.get('MMCLISMS_BULK_MODEM_RATE', '0')) or None
+bulk_carrier_rate = float(os.environ.get('MMCLISMS_BULK_CARRIER_RATE', '0')) or None
+carrier_prefixes = json.loads(os.environ.get('MMCLISMS_CARRIER_PREFIXES', '{}'))
+# SMS objects created ahead of sending, per modem, by the send pipeline.
+pipeline_depth = int(os.environ.get('MMCLISMS_PIPELINE_DEPTH', '8'))
+
+# Outbox: seconds a worker may hold a message before it counts as crashed,
+# retry limits and backoff, and how often idle workers look for due messages.
+outbox_lease = float(os.environ.get('MMCLISMS_OUTBOX_LEASE', '120'))
+outbox_max_attempts = int(os.environ.get('MMCLISMS_OUTBOX_MAX_ATTEMPTS', '5'))
+outbox_backoff_base = float(os.environ.get('MMCLISMS_OUTBOX_BACKOFF', '5'))
+outbox_backoff_max = float(os.environ.get('MMCLISMS_OUTBOX_BACKOFF_MAX', '900'))
+outbox_poll_interval = float(os.environ.get('MMCLISMS_OUTBOX_POLL_INTERVAL', '0.5'))
+
+# Daemon (main.py serve): Unix socket path and number of outbox workers.
+daemon_socket = os.environ.get('MMCLISMS_SOCKET', os.path.join(os.environ.get('XDG_RUNTIME_DIR', '/tmp'), 'mmclisms.sock'))
+daemon_workers = int(os.environ.get('MMCLISMS_DAEMON_WORKERS', '2'))
+# Port of the daemon's HTTP API on localhost, off when unset.
+daemon_http_port = int(os.environ.get('MMCLISMS_HTTP_PORT', '0')) or None
+
+# Delete received SMS from the modem once they are stored in the database.
+delete_after_ingest = os.environ.get('MMCLISMS_DELETE_AFTER_INGEST', '0') == '1'
+
+# Prometheus metrics: port for /metrics on localhost and/or a file for the
+# node_exporter textfile collector, rewritten every metrics_interval seconds.
+metrics_port = int(os.environ.get('MMCLISMS_METRICS_PORT', '0')) or None
+metrics_file = os.environ.get('MMCLISMS_METRICS_FILE') or None
+metrics_interval = float(os.environ.get('MMCLISMS_METRICS_INTERVAL', '15'))
+
+# One connection per thread, kept open for the life of the process. sqlite3
+# caches prepared statements per connection, so repeated queries skip parsing.
+_local = threading.local()
+_connections = []
+_connections_lock = threading.Lock()
+_generation = 0
+
+def get_db():
+    """Return this thread's database connection, opening it on first use."""
+    conn = getattr(_local, 'conn', None)
+    if conn is None or getattr(_local, 'generation', None) != _generation:
+        conn = sqlite3.connect(database, check_same_thread=False, cached_statements=256)
+        conn.row_factory = sqlite3.Row
+        apply_db_profile(conn)
+        with _connections_lock:
+            _connections.append(conn)
+        _local.conn = conn
+        _local.generation = _generation
+    return conn
+
+def get_db_profile():
+    """Return the settings of the configured durability profile."""
+    profile = db_profiles.get(db_profile)
+    if profile is None:
+        print(f"Unknown database profile '{db_profile}', using 'balanced'.")
+        profile = db_profiles['balanced']
+    return profile
+
+def apply_db_profile(conn):
+    """Set journal mode, sync level and cache pragmas on a fresh connection."""
+    profile = get_db_profile()
+    for pragma in ('journal_mode', 'synchronous', 'mmap_size', 'cache_size', 'temp_store', 'wal_autocheckpoint'):
+        conn.execute(f"PRAGMA {pragma} = {profile[pragma]};")
+
+def checkpoint_db(mode=None):
+    """Checkpoint the WAL back into the database file. Returns (busy, log, checkpointed)."""
+    mode = mode or get_db_profile()['checkpoint_on_close']
+    return tuple(get_db().execute(f"PRAGMA wal_checkpoint({mode});").fetchone())
+
+def close_db():
+    """Checkpoint and close every connection opened by get_db. Threads reconnect on next use."""
+    global _generation
+    with _connections_lock:
+        if _connections:
+            try:
+                mode = get_db_profile()['checkpoint_on_close']
+                _connections[0].execute(f"PRAGMA wal_checkpoint({mode});")
+            except sqlite3.Error:
+                pass
+        for conn in _connections:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+        _connections.clear()
+        _generation += 1
+
+atexit.register(close_db)
+
+def release_db():
+    """Close this thread's connection. For short-lived threads, which would otherwise leave it open."""
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        return
+    _local.conn = None
+    with _connections_lock:
+        if conn in _connections:
+            _connections.remove(conn)
+    conn.close()
+
+# Prometheus metrics. Hot-path updates go to per-thread cells, so they take
+# no lock and allocate nothing; a scrape sums the cells of every thread.
+class ShardedCells:
+    """A row of numbers kept as one list per writing thread and summed on read.
+
+    The list of a thread that exits is added to a retired row, so there are
+    never more lists than live threads.
+    """
+
+    class Owner:
+        __slots__ = ('__weakref__',)  # dropped with the thread's locals
+
+    def __init__(self, size):
+        self.size = size
+        self._local = threading.local()
+        self._shards = {}
+        self._retired = [0] * size
+        self._lock = threading.RLock()  # _retire may run from a collection inside totals()
+
+    def cells(self):
+        """This thread's list; only this thread writes to it."""
+        cells = getattr(self._local, 'cells', None)
+        if cells is None:
+            import weakref
+            cells = self._local.cells = [0] * self.size
+            owner = self._local.owner = self.Owner()
+            with self._lock:
+                self._shards[id(owner)] = cells
+            weakref.finalize(owner, self._retire, id(owner))
+        return cells
+
+    def _retire(self, key):
+        with self._lock:
+            cells = self._shards.pop(key)
+            self._retired = [a + b for a, b in zip(self._retired, cells)]
+
+    def totals(self):
+        with self._lock:
+            shards = [self._retired, *self._shards.values()]
+        return [sum(column) for column in zip(*shards)]
+
+class Counter:
+    """Prometheus counter with at most one label."""
+
+    kind = 'counter'
+
+    def __init__(self, name, help, label=None):
+        self.name, self.help, self.label = name, help, label
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def _child(self, value):
+        child = self._children.get(value)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(value, ShardedCells(1))
+        return child
+
+    def inc(self, value='', amount=1):
+        self._child(value).cells()[0] += amount
+
+    def samples(self):
+        for value, child in list(self._children.items()):
+            yield self.name, {self.label: value} if self.label else {}, child.totals()[0]
+
+class Histogram(Counter):
+    """Prometheus histogram (seconds) with fixed bucket bounds and at most one label."""
+
+    kind = 'histogram'
+    default_buckets = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+    def __init__(self, name, help, label=None, buckets=default_buckets):
+        super().__init__(name, help, label)
+        self.buckets = buckets
+
+    def _child(self, value):
+        child = self._children.get(value)
+        if child is None:
+            with self._lock:
+                # one count per bucket, the +Inf bucket, then the sum
+                child = self._children.setdefault(value, ShardedCells(len(self.buckets) + 2))
+        return child
+
+    def observe(self, seconds, value=''):
+        cells = self._child(value).cells()
+        cells[bisect.bisect_left(self.buckets, seconds)] += 1
+        cells[-1] += seconds
+
+    def samples(self):
+        for value, child in list(self._children.items()):
+            totals = child.totals()
+            yield from histogram_samples(self.name, {self.label: value} if self.label else {},
+                                         zip(self.buckets, itertools.accumulate(totals[:-2])), sum(totals[:-1]), totals[-1])
+
+class Gauge(Counter):
+    """Prometheus gauge with at most one label, set by whoever knows the value."""
+
+    kind = 'gauge'
+
+    def set(self, number, value=''):
+        self._children[value] = number
+
+    def samples(self):
+        for value, number in list(self._children.items()):
+            yield self.name, {self.label: value} if self.label else {}, number
+
+def histogram_samples(name, labels, cumulative, count, total):
+    for bound, n in cumulative:
+        yield name + '_bucket', {**labels, 'le': f'{bound:g}'}, n
+    yield name + '_bucket', {**labels, 'le': '+Inf'}, count
+    yield name + '_count', labels, count
+    yield name + '_sum', labels, total
+
+sms_sent_metric = Counter('mmclisms_sms_sent_total', 'SMS sent.', 'modem')
+sms_failed_metric = Counter('mmclisms_sms_failed_total', 'SMS that could not be sent.', 'modem')
+sms_received_metric = Counter('mmclisms_sms_received_total', 'Received SMS stored in the database.', 'modem')
+modem_enabled_metric = Gauge('mmclisms_modem_enabled', 'Whether the modem is enabled (last seen state).', 'modem')
+sqlite_commit_metric = Histogram('mmclisms_sqlite_commit_duration_seconds', 'Time of SQLite commits.')
+metrics = [sms_sent_metric, sms_failed_metric, sms_received_metric, modem_enabled_metric, sqlite_commit_metric]
+
+def mmcli_metric_samples(name):
+    """mmcli call latency per operation, converted from the LatencyHistogram of each operation."""
+    buckets = Histogram.default_buckets
+    for op, s in sorted(mmcli_stats().items()):
+        h = s['histogram']
+        counts = [0] * len(buckets)
+        for b, n in h.counts.items():
+            i = bisect.bisect_left(buckets, h.bucket_value(b) / 1e6)
+            if i < len(buckets):
+                counts[i] += n
+        yield from histogram_samples(name, {'op': op}, zip(buckets, itertools.accumulate(counts)),
+                                     h.total, h.mean() * h.total / 1e6)
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def render_metrics():
+    """Return every metric in the Prometheus text format."""
+    families = [(m.name, m.help, m.kind, m.samples()) for m in metrics]
+    families.append(('mmclisms_mmcli_call_duration_seconds', 'Wall time of mmcli calls (1.6% precision).', 'histogram',
+                     mmcli_metric_samples('mmclisms_mmcli_call_duration_seconds')))
+    try:
+        counts = outbox_counts()
+    except sqlite3.Error:
+        counts = {}
+    states = ('queued', 'creating', 'sending', 'sent', 'failed')
+    families.append(('mmclisms_outbox_messages', 'Outbox messages per state.', 'gauge',
+                     (('mmclisms_outbox_messages', {'state': s}, counts.get(s, 0)) for s in states)))
+    lines = []
+    for name, help, kind, samples in families:
+        lines.append(f"# HELP {name} {help}")
+        lines.append(f"# TYPE {name} {kind}")
+        for sample, labels, value in samples:
+            label_text = ','.join(f'{k}="{escape_label(v)}"' for k, v in labels.items())
+            lines.append(f"{sample}{{{label_text}}} {value}" if label_text else f"{sample} {value}")
+    return '\n'.join(lines) + '\n'
+
+def write_metrics_file(path=None):
+    """Write the metrics for node_exporter's textfile collector, atomically."""
+    path = path or metrics_file
+    try:
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            f.write(render_metrics())
+        os.replace(path + '.tmp', path)
+    except OSError as e:
+        print(f"Error writing metrics to {path}: {e}", file=sys.stderr)
+
+_metrics_started = False
+
+def start_metrics_exporter(port=None, path=None):
+    """Serve /metrics on 127.0.0.1:port and/or rewrite a textfile every metrics_interval seconds.
+
+    Defaults come from MMCLISMS_METRICS_PORT and MMCLISMS_METRICS_FILE; with
+    neither set this does nothing.
+    """
+    global _metrics_started
+    port, path = port or metrics_port, path or metrics_file
+    if _metrics_started or not (port or path):
+        return
+    _metrics_started = True
+    if port:
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                try:
+                    body = render_metrics().encode('utf-8')
+                finally:
+                    release_db()  # every scrape runs on a new thread
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer(('127.0.0.1', port), MetricsHandler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name='metrics', daemon=True).start()
+    if path:
+        def write_periodically():
+            while True:
+                write_metrics_file(path)
+                time.sleep(metrics_interval)
+
+        threading.Thread(target=write_periodically, name='metrics-file', daemon=True).start()
+        atexit.register(write_metrics_file, path)
+
+def commit_db(conn):
+    """Commit conn and record how long it took in sqlite_commit_metric."""
+    start = time.perf_counter()
+    conn.commit()
+    sqlite_commit_metric.observe(time.perf_counter() - start)
+
+class DbTransaction:
+    """`with DbTransaction(conn):` works like `with conn:` but times the commit with commit_db()."""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            try:
+                commit_db(self.conn)
+                return False
+            except BaseException:
+                self.conn.rollback()
+                raise
+        self.conn.rollback()
+        return False
+
+def query_db(query, args=(), one=False):
+    """Query the database and return the results. Commits for non-SELECT queries."""
+    conn = get_db()
+    try:
+        cur = conn.execute(query, args)
+        qtype = query.strip().split()[0].upper() if query.strip() else ''
+        if qtype == 'SELECT':
+            rv = cur.fetchall()
+            return (rv[0] if rv else None) if one else rv
+        commit_db(conn)
+    except Exception:
+        # the connection outlives this call; don't leave it holding the write lock
+        conn.rollback()
+        raise
+    return cur.lastrowid
+
+history_schema = """
+CREATE TABLE IF NOT EXISTS history (id INTEGER PRIMARY KEY AUTOINCREMENT, tel VARCHAR(30) NOT NULL, last_message TIMESTAMP NOT NULL, send_count INTEGER NOT NULL DEFAULT 1);
+CREATE UNIQUE INDEX IF NOT EXISTS history_tel ON history (tel);
+CREATE INDEX IF NOT EXISTS history_last_message ON history (last_message);
+"""
+
+messages_schema = """
+CREATE TABLE IF NOT EXISTS messages (id INTEGER PRIMARY KEY AUTOINCREMENT, direction VARCHAR(3) NOT NULL, number VARCHAR(30), text TEXT, timestamp TIMESTAMP NOT NULL, state VARCHAR(20), modem VARCHAR(20), path VARCHAR(80));
+CREATE UNIQUE INDEX IF NOT EXISTS messages_path ON messages (direction, modem, path, timestamp);
+CREATE UNIQUE INDEX IF NOT EXISTS messages_received ON messages (IFNULL(number, ''), timestamp, IFNULL(text, '')) WHERE direction = 'in';
+CREATE INDEX IF NOT EXISTS messages_timestamp ON messages (timestamp);
+CREATE INDEX IF NOT EXISTS messages_number ON messages (number, timestamp);
+CREATE TABLE IF NOT EXISTS sms_seen (modem VARCHAR(20) NOT NULL, path VARCHAR(80) NOT NULL, ingested_at TIMESTAMP NOT NULL, run VARCHAR(80), PRIMARY KEY (modem, path));
+"""
+
+# Durable queue of outgoing messages: queued -> creating -> sending -> sent,
+# or back to queued with a backoff, and failed after outbox_max_attempts.
+# Times are unix seconds.
+outbox_schema = """
+CREATE TABLE IF NOT EXISTS outbox (id INTEGER PRIMARY KEY AUTOINCREMENT, tel VARCHAR(30) NOT NULL, text TEXT NOT NULL, modem VARCHAR(20), state VARCHAR(10) NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, next_attempt_at REAL NOT NULL, lease_owner VARCHAR(80), lease_until REAL, sms_path VARCHAR(80), last_error TEXT, created_at REAL NOT NULL, updated_at REAL NOT NULL);
+CREATE INDEX IF NOT EXISTS outbox_due ON outbox (state, next_attempt_at);
+"""
+
+# Full-text index over messages.text, kept in sync by triggers. Needs SQLite
+# built with FTS5; without it search_messages falls back to LIKE.
+messages_fts_schema = """
+CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(text, content='messages', content_rowid='id');
+CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN
+    INSERT INTO messages_fts (rowid, text) VALUES (new.id, new.text);
+END;
+CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN
+    INSERT INTO messages_fts (messages_fts, rowid, text) VALUES ('delete', old.id, old.text);
+END;
+CREATE TRIGGER IF NOT EXISTS messages_fts_update AFTER UPDATE OF text ON messages BEGIN
+    INSERT INTO messages_fts (messages_fts, rowid, text) VALUES ('delete', old.id, old.text);
+    INSERT INTO messages_fts (rowid, text) VALUES (new.id, new.text);
+END;
+"""
+
+# Stored in PRAGMA user_version once create_schema has run, so init_db can
+# skip the schema checks on later starts. Bump it whenever a schema changes.
+schema_version = 2
+
+def create_schema(out=None):
+    """Create tables and indexes that do not exist yet. Notices go to out (default: stdout)."""
+    conn = get_db()
+    migrate_messages(out)
+    conn.executescript(history_schema + messages_schema + outbox_schema)
+    try:
+        conn.executescript(messages_fts_schema)
+    except sqlite3.OperationalError as e:
+        print(f"Full-text search unavailable ({e}), message search will be slower.", file=out)
+    conn.execute(f"PRAGMA user_version = {schema_version};")
+
+def migrate_messages(out=None):
+    """Update messages and sms_seen from schema version 1, where received messages were unique per modem and path.
+
+    ModemManager numbers both anew when it restarts, so the same message
+    could be stored twice. Removes those copies before create_schema adds
+    the index on number, timestamp and text, and adds sms_seen.run.
+    """
+    conn = get_db()
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'messages';").fetchone():
+        return False
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'messages_received';").fetchone():
+        return False
+    seen_columns = [row['name'] for row in conn.execute("PRAGMA table_info(sms_seen);")]
+    try:
+        conn.execute("BEGIN IMMEDIATE;")
+        if seen_columns and 'run' not in seen_columns:
+            conn.execute("ALTER TABLE sms_seen ADD COLUMN run VARCHAR(80);")
+        removed = conn.execute(
+            "DELETE FROM messages WHERE direction = 'in' AND id NOT IN (SELECT MIN(id) FROM messages WHERE direction = 'in' "
+            "GROUP BY IFNULL(number, ''), timestamp, IFNULL(text, ''));").rowcount
+        commit_db(conn)
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+    if removed:
+        print(f"Removed {removed} duplicate received messages.", file=out)
+    return True
+
+def migrate_history(out=None):
+    """Collapse the old append-only history table to one row per number, in place.
+
+    Keeps the newest row of every number, stores the number of sends in
+    send_count and the latest timestamp in last_message, then adds the indexes.
+    """
+    conn = get_db()
+    columns = [row['name'] for row in conn.execute("PRAGMA table_info(history);")]
+    if 'send_count' in columns:
+        return False
+    print("Migrating history table to one row per number...", file=out)
+    try:
+        conn.executescript("""
+            BEGIN IMMEDIATE;
+            ALTER TABLE history ADD COLUMN send_count INTEGER NOT NULL DEFAULT 1;
+            CREATE TEMP TABLE history_keep (id INTEGER PRIMARY KEY, last_message TIMESTAMP, send_count INTEGER);
+            INSERT INTO history_keep SELECT MAX(id), MAX(last_message), COUNT(*) FROM history GROUP BY tel;
+            DELETE FROM history WHERE id NOT IN (SELECT id FROM history_keep);
+            UPDATE history SET (last_message, send_count) =
+                (SELECT k.last_message, k.send_count FROM history_keep k WHERE k.id = history.id);
+            DROP TABLE history_keep;
+        """ + history_schema + """
+            COMMIT;
+        """)
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+    print("History table migrated.", file=out)
+    return True
+
+def init_db(interactive=True):
+    """Initialize the database with the schema. Without interactive, creates missing tables without asking."""
+    out = sys.stdout if interactive else sys.stderr  # keep command output machine-readable
+    # Check if database file exists
+    db_exists = os.path.exists(database)
+    # A schema created by this version needs no checks (one read of the file header)
+    if db_exists and get_db().execute("PRAGMA user_version;").fetchone()[0] == schema_version:
+        replay_history_journal(out)
+        return
+    # Query database and check if history table exists
+    if db_exists:
+        table = query_db("SELECT name FROM sqlite_master WHERE type='table' AND name='history';", one=True)
+        if table:
+            migrate_history(out)
+            create_schema(out)
+            replay_history_journal(out)
+            return  # Table exists, no need to initialize
+        else:
+            print("Database file found but history table is missing. Creating table...", file=out)
+            if interactive:
+                response = input("Do you want to create the history table? (y/n): ")
+                if response.lower() != 'y':
+                    print("Exiting without creating table.", file=out)
+                    return
+            # Create the history table (SQLite compatible)
+            create_schema(out)
+            print("History table created.", file=out)
+    else:
+        # If db does not exist, create it and the table
+        print("Database file not found. Creating database and history table: " + database, file=out)
+        # create file by creating table
+        create_schema(out)
+        print("Database and history table created.", file=out)
+    replay_history_journal(out)
+
+def get_history():
+    """Retrieve all history records, one per number, most recent first."""
+    flush_history()
+    return query_db("SELECT * FROM history ORDER BY last_message DESC;")
+
+def history_cursor(row):
+    """Return the keyset cursor that continues after the given history row."""
+    return (row['last_message'], row['id'])
+
+def get_history_page(page_size=20, after=None, search=None):
+    """Return up to page_size history rows, most recent first.
+
+    after is the history_cursor() of the last row of the previous page; search
+    keeps only numbers containing the given text. Pages are read with a keyset
+    condition on (last_message, id), so every page costs the same.
+    """
+    where, args = [], []
+    if after is not None:
+        where.append("(last_message, id) < (?, ?)")
+        args.extend(after)
+    if search:
+        where.append("tel LIKE ? ESCAPE '\\'")
+        args.append('%' + search.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%')
+    sql = "SELECT * FROM history"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY last_message DESC, id DESC LIMIT ?;"
+    return query_db(sql, (*args, page_size))
+
+def iter_history(page_size=100, after=None, search=None):
+    """Yield history rows lazily, most recent first, one page in memory at a time."""
+    flush_history()
+    while True:
+        page = get_history_page(page_size, after, search)
+        yield from page
+        if len(page) < page_size:
+            return
+        after = history_cursor(page[-1])
+
+def insert_history_rows(rows):
+    """Record (tel, timestamp) sends in a single transaction, one row per number."""
+    conn = get_db()
+    with DbTransaction(conn):
+        conn.executemany(
+            "INSERT INTO history (tel, last_message) VALUES (?, ?) "
+            "ON CONFLICT (tel) DO UPDATE SET last_message = MAX(last_message, excluded.last_message), "
+            "send_count = send_count + 1;",
+            rows)
+
+def history_journal_path(pid=None):
+    """Journal of one process's HistoryWriter. The writer holds an flock on path + '.lock' while it runs."""
+    return f"{database}.history-journal.{pid or os.getpid()}"
+
+def read_history_journal(path):
+    rows = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                tel, timestamp = json.loads(line)
+            except ValueError:
+                continue  # torn write from a crash
+            rows.append((tel, timestamp))
+    return rows
+
+def replay_history_journal(out=None):
+    """Write rows left in history journals by processes that exited without flushing them.
+
+    A journal is only touched once its lock can be taken, so the journals of
+    running writers (another menu, the daemon) are left alone.
+    """
+    import fcntl
+    import glob
+    journals = [(p[:-len('.lock')], p) for p in glob.glob(glob.escape(database) + '.history-journal.*.lock')]
+    journals.append((database + '.history-journal', None))  # written by versions without per-process journals
+    for path, lock_path in journals:
+        try:
+            lock = open(lock_path, 'r+') if lock_path else None
+        except FileNotFoundError:
+            continue  # replayed by another process meanwhile
+        try:
+            if lock:
+                try:
+                    fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    continue  # its writer is still running
+            for p in (path + '.flushing', path):
+                if not os.path.exists(p):
+                    continue
+                rows = read_history_journal(p)
+                if rows:
+                    insert_history_rows(rows)
+                    print(f"Recovered {len(rows)} history entries from {p}.", file=out)
+                os.remove(p)
+            if lock:
+                try:
+                    os.remove(lock_path)
+                except FileNotFoundError:
+                    pass  # a writer unlinked it on close
+        finally:
+            if lock:
+                lock.close()
+
+class HistoryWriter:
+    """Write-behind buffer for history rows.
+
+    add() appends the row to a journal file and returns; a background thread
+    inserts buffered rows with executemany once batch_size rows are waiting or
+    flush_interval seconds have passed. On flush the journal is rotated aside
+    and removed only after the batch is committed, so rows survive a crash and
+    are replayed by replay_history_journal() on the next start. Each process
+    writes its own journal, locked for as long as the writer runs.
+    """
+
+    def __init__(self, batch_size=100, flush_interval=1.0, journal_path=None):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.journal_path = journal_path or history_journal_path()
+        self.fsync = get_db_profile()['synchronous'] == 'FULL'
+        self._pending = []
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._closed = False
+        replay_history_journal(sys.stderr)  # may run under --json
+        import fcntl
+        while True:
+            self._lock = open(self.journal_path + '.lock', 'a')
+            fcntl.flock(self._lock, fcntl.LOCK_EX)
+            try:
+                if os.path.samestat(os.fstat(self._lock.fileno()), os.stat(self._lock.name)):
+                    break
+            except FileNotFoundError:
+                pass
+            self._lock.close()  # removed by a replay of a dead process with our pid; lock a new file
+        self._journal = open(self.journal_path, 'a', encoding='utf-8')
+        self._thread = threading.Thread(target=self._run, name='history-writer', daemon=True)
+        self._thread.start()
+
+    def add(self, tel, timestamp):
+        with self._cond:
+            self._journal.write(json.dumps([tel, timestamp]) + '\n')
+            self._journal.flush()
+            if self.fsync:
+                os.fsync(self._journal.fileno())
+            self._pending.append((tel, timestamp))
+            if len(self._pending) >= self.batch_size:
+                self._cond.notify()
+
+    def flush(self):
+        """Commit every buffered row. Safe to call from any thread."""
+        with self._flush_lock:
+            flushing = self.journal_path + '.flushing'
+            with self._cond:
+                if not self._pending:
+                    return 0
+                rows, self._pending = self._pending, []
+                self._journal.close()
+                try:
+                    if os.path.exists(flushing):
+                        # a previous flush failed; keep its rows in the same file
+                        with open(self.journal_path, encoding='utf-8') as src, open(flushing, 'a', encoding='utf-8') as dst:
+                            dst.write(src.read())
+                        os.remove(self.journal_path)
+                    else:
+                        os.replace(self.journal_path, flushing)
+                except OSError:
+                    self._pending[:0] = rows
+                    raise
+                finally:
+                    self._journal = open(self.journal_path, 'a', encoding='utf-8')
+            try:
+                insert_history_rows(rows)
+            except sqlite3.Error:
+                with self._cond:
+                    self._pending[:0] = rows
+                raise
+            os.remove(flushing)
+            return len(rows)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+        self._journal.close()
+        if os.path.exists(self.journal_path) and os.path.getsize(self.journal_path) == 0:
+            os.remove(self.journal_path)
+        if not os.path.exists(self.journal_path) and not os.path.exists(self.journal_path + '.flushing'):
+            os.remove(self.journal_path + '.lock')
+        self._lock.close()  # whatever is left is replayed by the next process
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._closed and len(self._pending) < self.batch_size:
+                    self._cond.wait(self.flush_interval)
+                closed = self._closed
+            try:
+                self.flush()
+            except (sqlite3.Error, OSError) as e:
+                print(f"Error writing history: {e}")
+            if closed:
+                return
+
+_history_writer = None
+_history_writer_lock = threading.Lock()
+
+def get_history_writer():
+    """Return the process-wide HistoryWriter, starting it on first use."""
+    global _history_writer
+    with _history_writer_lock:
+        if _history_writer is None:
+            _history_writer = HistoryWriter(history_batch_size, history_flush_interval)
+        return _history_writer
+
+def flush_history():
+    """Commit history rows still buffered by the write-behind writer."""
+    if _history_writer is not None:
+        _history_writer.flush()
+
+def close_history_writer():
+    """Flush and stop the write-behind writer (registered with atexit)."""
+    global _history_writer
+    with _history_writer_lock:
+        if _history_writer is not None:
+            _history_writer.close()
+            _history_writer = None
+
+atexit.register(close_history_writer)
+
+class HistoryIndex:
+    """In-memory type-ahead index over history numbers.
+
+    Prefix lookups bisect a sorted list of the numbers. Substring lookups use
+    posting lists of every 4-character window: only numbers containing the
+    rarest window of the query are checked. Shorter queries walk the posting
+    lists of the windows that contain them.
+    """
+
+    gram = 4
+
+    def __init__(self, numbers=()):
+        self._numbers = []
+        self._sorted = []
+        self._grams = {}
+        self._short = []  # numbers shorter than one window
+        self._lock = threading.Lock()
+        for tel in numbers:
+            self._add(tel)
+        self._sorted = sorted(self._numbers)
+
+    def __len__(self):
+        return len(self._numbers)
+
+    def add(self, tel):
+        with self._lock:
+            i = bisect.bisect_left(self._sorted, tel)
+            if i < len(self._sorted) and self._sorted[i] == tel:
+                return
+            self._sorted.insert(i, tel)
+            self._add(tel)
+
+    def _add(self, tel):
+        idx = len(self._numbers)
+        self._numbers.append(tel)
+        if len(tel) < self.gram:
+            self._short.append(tel)
+        # once per distinct window, so a number with a repeated window is listed once
+        for window in {tel[j:j + self.gram] for j in range(len(tel) - self.gram + 1)}:
+            postings = self._grams.get(window)
+            if postings is None:
+                postings = self._grams[window] = array('I')
+            postings.append(idx)
+
+    def iter_prefix(self, prefix):
+        i = bisect.bisect_left(self._sorted, prefix)
+        while i < len(self._sorted) and self._sorted[i].startswith(prefix):
+            yield self._sorted[i]
+            i += 1
+
+    def iter_substring(self, text):
+        if len(text) >= self.gram:
+            windows = (self._grams.get(text[j:j + self.gram], ()) for j in range(len(text) - self.gram + 1))
+            for idx in min(windows, key=len):
+                if text in self._numbers[idx]:
+                    yield self._numbers[idx]
+            return
+        # short query: every match contains a window that contains the query
+        seen = set()
+        for window, postings in self._grams.items():
+            if text in window:
+                for idx in postings:
+                    if idx not in seen:
+                        seen.add(idx)
+                        yield self._numbers[idx]
+        for tel in self._short:
+            if text in tel:
+                yield tel
+
+    def search(self, text, limit=20, offset=0):
+        """Return numbers starting with text, then numbers containing it."""
+        def matches():
+            seen = set()
+            for tel in self.iter_prefix(text):
+                seen.add(tel)
+                yield tel
+            for tel in self.iter_substring(text):
+                if tel not in seen:
+                    yield tel
+        with self._lock:
+            return list(itertools.islice(matches(), offset, offset + limit))
+
+_history_index = None
+_history_index_lock = threading.Lock()
+
+def get_history_index():
+    """Return the history search index, loading every number from the database once."""
+    global _history_index
+    with _history_index_lock:
+        if _history_index is None:
+            flush_history()
+            _history_index = HistoryIndex(row[0] for row in get_db().execute("SELECT tel FROM history;"))
+        return _history_index
+
+def search_history(text, limit=20, offset=0):
+    """Return history rows whose number starts with or contains text, prefix matches first."""
+    tels = get_history_index().search(text, limit, offset)
+    if not tels:
+        return []
+    flush_history()
+    rows = {row['tel']: row for row in query_db(
+        f"SELECT * FROM history WHERE tel IN ({', '.join('?' * len(tels))});", tels)}
+    return [rows[tel] for tel in tels if tel in rows]
+
+def add_history(tel, timestamp):
+    """Add a new history record. With write-behind enabled the insert is batched."""
+    if history_write_behind:
+        get_history_writer().add(tel, timestamp)
+    else:
+        insert_history_rows([(tel, timestamp)])
+    if _history_index is not None:
+        _history_index.add(tel)
+
+def add_messages(rows):
+    """Store (direction, number, text, timestamp, state, modem, path) rows, skipping ones already stored.
+
+    direction is 'out' for sent and 'in' for received messages.
+    """
+    conn = get_db()
+    with DbTransaction(conn):
+        conn.executemany(
+            "INSERT OR IGNORE INTO messages (direction, number, text, timestamp, state, modem, path) VALUES (?, ?, ?, ?, ?, ?, ?);",
+            rows)
+
+def search_messages(text, limit=50):
+    """Return stored messages matching every word of text, best matches first."""
+    words = text.split()
+    if not words:
+        return []
+    if query_db("SELECT name FROM sqlite_master WHERE name='messages_fts';", one=True):
+        match = ' '.join('"' + w.replace('"', '""') + '"' for w in words)
+        return query_db(
+            "SELECT m.* FROM messages_fts JOIN messages m ON m.id = messages_fts.rowid "
+            "WHERE messages_fts MATCH ? ORDER BY rank LIMIT ?;", (match, limit))
+    where = " AND ".join("text LIKE ?" for _ in words)
+    return query_db(f"SELECT * FROM messages WHERE {where} ORDER BY timestamp DESC LIMIT ?;",
+                    (*('%' + w + '%' for w in words), limit))
+
+class ModemError(Exception):
+    """A modem operation failed. stdout/stderr carry mmcli output when there is any."""
+
+    def __init__(self, message, stdout=None, stderr=None):
+        super().__init__(message)
+        self.stdout = stdout
+        self.stderr = stderr
+
+def msgspec_loads(msgspec):
+    decode = msgspec.json.decode
+
+    def loads(data):
+        try:
+            return decode(data)
+        except msgspec.DecodeError as e:
+            raise ValueError(str(e)) from e
+    return loads
+
+def msgspec_sms_decoder(msgspec):
+    """Return read(path, data) decoding `mmcli -s PATH --output-json` output into structs.
+
+    Only content.number, content.text, properties.state and properties.timestamp
+    are decoded. read returns None when any of them is missing or the output has
+    another shape, and parse_sms has to look at the whole document instead.
+    """
+    from typing import Optional
+
+    class Content(msgspec.Struct):
+        number: Optional[str] = None
+        text: Optional[str] = None
+
+    class Properties(msgspec.Struct):
+        state: Optional[str] = None
+        timestamp: Optional[str] = None
+
+    class Sms(msgspec.Struct):
+        content: Optional[Content] = None
+        properties: Optional[Properties] = None
+
+    class Output(msgspec.Struct):
+        sms: Optional[Sms] = None
+
+    decode = msgspec.json.Decoder(Output).decode
+
+    def read(path, data):
+        try:
+            sms = decode(data).sms
+        except msgspec.DecodeError:
+            return None
+        if sms is None or sms.content is None or sms.properties is None:
+            return None
+        content, props = sms.content, sms.properties
+        if not (content.number and content.text and props.timestamp and props.state):
+            return None
+        return {'path': path, 'number': content.number, 'text': content.text,
+                'timestamp': props.timestamp, 'state': props.state, 'raw': None}
+    return read
+
+def open_json_decoder(name=None):
+    """Return (name, loads, read_sms) for the named decoder ('msgspec', 'orjson', 'json' or 'auto').
+
+    loads takes bytes or str and raises ValueError on bad input. read_sms is
+    the msgspec struct decoder, or None. A decoder that is not installed falls
+    back to the next one, down to the json module.
+    """
+    name = name or json_decoder
+    if name in ('msgspec', 'auto'):
+        try:
+            import msgspec
+            return 'msgspec', msgspec_loads(msgspec), msgspec_sms_decoder(msgspec)
+        except ImportError:
+            pass
+    if name in ('msgspec', 'orjson', 'auto'):
+        try:
+            import orjson
+            return 'orjson', orjson.loads, None
+        except ImportError:
+            pass
+    return 'json', json_loads, None
+
+def json_loads(data):
+    # json.loads would detect the encoding of bytes first, which mmcli output does not need
+    return json.loads(data.decode() if isinstance(data, bytes) else data)
+
+_json = None
+
+def get_json_decoder():
+    """Return the process-wide (name, loads, read_sms), picking the decoder on first use."""
+    global _json
+    if _json is None:
+        _json = open_json_decoder()
+    return _json
+
+def load_json(data):
+    """Decode mmcli JSON output, bytes or str. Raises ValueError."""
+    return get_json_decoder()[1](data)
+
+def decode_sms(path, data):
+    """Build a message dict from `mmcli -s PATH --output-json` output, bytes or str.
+
+    Uses the struct decoder when there is one ('raw' is None then) and
+    parse_sms otherwise. Raises ValueError, or AttributeError when the
+    output is JSON but not an object.
+    """
+    _, loads, read_sms = get_json_decoder()
+    message = read_sms(path, data) if read_sms else None
+    return message or parse_sms(path, loads(data))
+
+def parse_sms(path, data):
+    """Build a message dict from the decoded `mmcli -s PATH --output-json` output."""
+    sms = data.get('sms') or data.get('message') or data
+    # mmcli nests fields under 'content' and 'properties'
+    content = sms.get('content') if isinstance(sms.get('content'), dict) else {}
+    props = sms.get('properties') if isinstance(sms.get('properties'), dict) else {}
+    # try to extract common fields
+    number = content.get('number') or sms.get('number') or sms.get('from') or sms.get('sender') or sms.get('tel') or None
+    text = content.get('text') or sms.get('text') or sms.get('content') or sms.get('payload') or None
+    timestamp = props.get('timestamp') or sms.get('timestamp') or sms.get('date') or None
+    state = props.get('state') or sms.get('state') or None
+    return {'path': path, 'number': number, 'text': text, 'timestamp': timestamp, 'state': state, 'raw': sms}
+
+SMS_PATH_PREFIX = '/org/freedesktop/ModemManager1/SMS/'
+
+def extract_sms_paths(data):
+    """Return the SMS paths from `mmcli -m N --messaging-list-sms --output-json` output.
+
+    mmcli prints {"modem": {"messaging": {"sms": [paths]}}}; other shapes
+    are searched for SMS path strings with an explicit stack instead.
+    """
+    try:
+        paths = data['modem']['messaging']['sms']
+    except (KeyError, TypeError):
+        paths = None
+    if isinstance(paths, list):
+        return [p for p in paths if isinstance(p, str) and p.startswith(SMS_PATH_PREFIX)]
+    found = []
+    stack = [(iter((data,)), False)]  # (remaining values, whether they are list items)
+    while stack:
+        items, in_list = stack[-1]
+        for obj in items:
+            if isinstance(obj, dict):
+                stack.append((iter(obj.values()), False))
+                break
+            if isinstance(obj, list):
+                stack.append((iter(obj), True))
+                break
+            if in_list and isinstance(obj, str) and obj.startswith(SMS_PATH_PREFIX):
+                found.append(obj)
+        else:
+            stack.pop()
+    return found
+
+class Watcher:
+    """Runs a backend watcher loop in a daemon thread until stop() is called."""
+
+    def __init__(self, run, stop):
+        self._stop = stop
+        self._thread = threading.Thread(target=run, name='backend-watch', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop()
+        self._thread.join()
+
+class LatencyHistogram:
+    """HDR-style histogram of integer values (microseconds): log-linear buckets, about 1.6% precision.
+
+    Values below 64 get a bucket each; larger ones keep their top 6 bits. The
+    sparse bucket counts can be merged and saved as JSON.
+    """
+
+    def __init__(self, counts=None):
+        self.counts = {int(k): v for k, v in (counts or {}).items()}
+        self.total = sum(self.counts.values())
+
+    @staticmethod
+    def bucket(value):
+        shift = max(0, value.bit_length() - 6)
+        return (shift << 6) | (value >> shift)
+
+    @staticmethod
+    def bucket_value(bucket):
+        """The midpoint of a bucket's value range."""
+        shift, mantissa = bucket >> 6, bucket & 63
+        return (mantissa << shift) + ((1 << shift) >> 1)
+
+    def record(self, value):
+        b = self.bucket(max(0, int(value)))
+        self.counts[b] = self.counts.get(b, 0) + 1
+        self.total += 1
+
+    def merge(self, other):
+        for b, n in other.counts.items():
+            self.counts[b] = self.counts.get(b, 0) + n
+        self.total += other.total
+
+    def percentile(self, p):
+        """Value at or below which p percent of the recorded values fall."""
+        if not self.total:
+            return 0
+        rank, seen = max(1, round(self.total * p / 100)), 0
+        for b in sorted(self.counts):
+            seen += self.counts[b]
+            if seen >= rank:
+                return self.bucket_value(b)
+
+    def mean(self):
+        return sum(self.bucket_value(b) * n for b, n in self.counts.items()) / self.total if self.total else 0
+
+    def max(self):
+        return self.bucket_value(max(self.counts)) if self.counts else 0
+
+# mmcli calls per operation: counters and a wall time histogram, saved to
+# mmcli_stats_path() at exit so `main.py stats` can show them.
+_mmcli_stats = {}
+_mmcli_stats_lock = threading.Lock()
+
+def mmcli_operation(args):
+    """Name the kind of mmcli call: list, info, enable, create, send, read, list-sms or delete."""
+    if '-L' in args:
+        return 'list'
+    for arg in args:
+        if arg.startswith('--messaging-create-sms'):
+            return 'create'
+        if arg.startswith('--messaging-delete-sms'):
+            return 'delete'
+        if arg == '--messaging-list-sms':
+            return 'list-sms'
+        if arg in ('--enable', '--disable'):
+            return 'enable'
+        if arg == '--send':
+            return 'send'
+    return 'read' if args[:1] == ['-s'] else 'info'
+
+def new_mmcli_stats():
+    return {'calls': 0, 'errors': 0, 'exit_codes': {}, 'stdout_size': 0, 'stderr_size': 0, 'histogram': LatencyHistogram()}
+
+def record_mmcli_call(op, seconds, returncode, stdout_size=0, stderr_size=0):
+    """Count one mmcli call. returncode is None when mmcli could not be started."""
+    with _mmcli_stats_lock:
+        s = _mmcli_stats.get(op)
+        if s is None:
+            s = _mmcli_stats[op] = new_mmcli_stats()
+        s['calls'] += 1
+        s['errors'] += returncode != 0
+        code = str(returncode)
+        s['exit_codes'][code] = s['exit_codes'].get(code, 0) + 1
+        s['stdout_size'] += stdout_size
+        s['stderr_size'] += stderr_size
+        s['histogram'].record(seconds * 1e6)
+
+def run_mmcli(args, text=True):
+    """Run mmcli with the given arguments and record the call. Returns the CompletedProcess; raises ModemError.
+
+    With text=False stdout and stderr are bytes, except in the ModemError.
+    """
+    import subprocess
+    op = mmcli_operation(args)
+    start = time.perf_counter()
+    try:
+        res = subprocess.run([mmcli_bin, *args], capture_output=True, text=text)
+    except OSError as e:
+        record_mmcli_call(op, time.perf_counter() - start, None)
+        raise ModemError(f"cannot run {mmcli_bin}: {e}") from e
+    record_mmcli_call(op, time.perf_counter() - start, res.returncode, len(res.stdout), len(res.stderr))
+    if res.returncode != 0:
+        out, err = (res.stdout, res.stderr) if text else (res.stdout.decode(errors='replace'), res.stderr.decode(errors='replace'))
+        e = subprocess.CalledProcessError(res.returncode, res.args, out, err)
+        raise ModemError(f"mmcli error: {e}", out, err) from e
+    return res
+
+def mmcli_stats_path():
+    """File the mmcli call statistics are added to at exit; '' disables saving."""
+    return os.environ.get('MMCLISMS_MMCLI_STATS', database + '.mmcli-stats.json')
+
+def merge_mmcli_stats(into, stats):
+    for op, s in stats.items():
+        t = into.setdefault(op, new_mmcli_stats())
+        for key in ('calls', 'errors', 'stdout_size', 'stderr_size'):
+            t[key] += s[key]
+        for code, n in s['exit_codes'].items():
+            t['exit_codes'][code] = t['exit_codes'].get(code, 0) + n
+        t['histogram'].merge(s['histogram'])
+    return into
+
+def load_mmcli_stats(path=None):
+    """Read saved statistics. Returns {} when there are none."""
+    try:
+        with open(path or mmcli_stats_path(), encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return {op: {**s, 'histogram': LatencyHistogram(s['histogram'])} for op, s in data.items()}
+
+def mmcli_stats(saved=False):
+    """Statistics of this process's mmcli calls, plus the saved ones with saved=True."""
+    with _mmcli_stats_lock:
+        current = merge_mmcli_stats({}, _mmcli_stats)
+    return merge_mmcli_stats(load_mmcli_stats(), current) if saved else current
+
+def save_mmcli_stats():
+    """Add this process's mmcli statistics to the stats file, under an exclusive lock."""
+    path = mmcli_stats_path()
+    with _mmcli_stats_lock:
+        if not path or not _mmcli_stats:
+            return
+        stats = merge_mmcli_stats({}, _mmcli_stats)
+        _mmcli_stats.clear()
+    import fcntl
+    try:
+        with open(path + '.lock', 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            merge_mmcli_stats(stats, load_mmcli_stats(path))
+            data = {op: {**s, 'histogram': s['histogram'].counts} for op, s in stats.items()}
+            with open(path + '.tmp', 'w', encoding='utf-8') as f:
+                json.dump(data, f)
+            os.replace(path + '.tmp', path)
+    except OSError as e:
+        print(f"Error saving mmcli statistics: {e}", file=sys.stderr)
+
+atexit.register(save_mmcli_stats)
+
+def mmcli_stats_rows(stats):
+    """One summary dict per operation, times in milliseconds."""
+    rows = []
+    for op, s in sorted(stats.items()):
+        h = s['histogram']
+        rows.append({'op': op, 'calls': s['calls'], 'errors': s['errors'], 'exit_codes': s['exit_codes'],
+                     'mean_ms': h.mean() / 1000, 'p50_ms': h.percentile(50) / 1000, 'p90_ms': h.percentile(90) / 1000,
+                     'p99_ms': h.percentile(99) / 1000, 'max_ms': h.max() / 1000,
+                     'stdout_size_avg': s['stdout_size'] / s['calls'] if s['calls'] else 0})
+    return rows
+
+_modemmanager_pid = None
+
+def modemmanager_start(pid):
+    """Start time (in clock ticks after boot) of process pid if it is ModemManager, else None."""
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            stat = f.read()
+    except OSError:
+        return None
+    name_end = stat.rfind(')')
+    if stat[stat.find('(') + 1:name_end] != 'ModemManager':
+        return None
+    return stat[name_end + 2:].split()[19]
+
+def modemmanager_instance():
+    """'pid:start time' of the local ModemManager process, which changes when it restarts; None if not found."""
+    global _modemmanager_pid
+    start = modemmanager_start(_modemmanager_pid) if _modemmanager_pid else None
+    if start is None:
+        _modemmanager_pid = None
+        try:
+            pids = [p for p in os.listdir('/proc') if p.isdigit()]
+        except OSError:
+            pids = []
+        for pid in pids:
+            start = modemmanager_start(pid)
+            if start is not None:
+                _modemmanager_pid = pid
+                break
+    return f"{_modemmanager_pid}:{start}" if start else None
+
+class MmcliBackend:
+    """Modem operations implemented by running the mmcli command line tool.
+
+    Every backend offers the same methods: list_modems, modem_info,
+    set_enabled, create_sms, send_sms, list_sms, read_sms, read_sms_many,
+    delete_sms, watch_sms, watch_modem, watch_modems, manager_instance and
+    close. Failures raise ModemError.
+    """
+
+    name = 'mmcli'
+
+    def _run(self, args, text=True):
+        return run_mmcli(args, text)
+
+    def _run_json(self, args, decode=None):
+        out = self._run([*args, '--output-json'], text=False).stdout
+        try:
+            return decode(out) if decode else load_json(out)
+        except (ValueError, AttributeError) as e:
+            raise ModemError(f"cannot parse mmcli output: {e}", out.decode(errors='replace')) from e
+
+    def list_modems(self):
+        data = self._run_json(['-L'])
+        return [p.rstrip('/').split('/')[-1] for p in data.get('modem-list') or []]
+
+    def modem_info(self, modem_id):
+        data = self._run_json(['-m', str(modem_id)])
+        modem = data.get('modem', {})
+        generic = modem.get('generic', {})
+        quality = (generic.get('signal-quality') or {}).get('value')
+        return {
+            'own_numbers': generic.get('own-numbers') or [],
+            'state': generic.get('state'),
+            'signal_quality': int(quality) if str(quality).isdigit() else None,
+        }
+
+    def set_enabled(self, modem_id, enable=True):
+        self._run(['-m', str(modem_id), '--enable' if enable else '--disable'])
+
+    def create_sms(self, modem_id, tel, message):
+        payload = f"text='{message}',number='{tel}'"
+        res = self._run(['-m', str(modem_id), f'--messaging-create-sms={payload}'])
+        out = res.stdout or res.stderr or ''
+        # mmcli prints the created SMS path like: /org/freedesktop/ModemManager1/SMS/12
+        import re
+        m = re.search(r"(/org/freedesktop/ModemManager1/SMS/\d+)", out)
+        if not m:
+            raise ModemError("Failed to create SMS (no SMS path found).", out.strip())
+        return m.group(1)
+
+    def send_sms(self, sms_path):
+        self._run(['-s', sms_path, '--send'])
+
+    def list_sms(self, modem_id):
+        return extract_sms_paths(self._run_json(['-m', str(modem_id), '--messaging-list-sms']))
+
+    def read_sms(self, sms_path):
+        return self._run_json(['-s', sms_path], lambda out: decode_sms(sms_path, out))
+
+    async def _read_sms_async(self, path, semaphore):
+        import asyncio
+        async with semaphore:
+            start = time.perf_counter()
+            proc = await asyncio.create_subprocess_exec(
+                mmcli_bin, '-s', path, '--output-json',
+                stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
+            out, err = await proc.communicate()
+            record_mmcli_call('read', time.perf_counter() - start, proc.returncode, len(out), len(err))
+        if proc.returncode != 0:
+            return path, None, (out + err).decode(errors='replace')
+        try:
+            return path, decode_sms(path, out), ''
+        except (ValueError, AttributeError):
+            return path, None, out.decode(errors='replace')
+
+    async def _read_sms_all(self, paths, concurrency):
+        import asyncio
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+        return await asyncio.gather(*(self._read_sms_async(p, semaphore) for p in paths))
+
+    def read_sms_many(self, paths, concurrency):
+        import asyncio
+        return asyncio.run(self._read_sms_all(paths, concurrency))
+
+    def delete_sms(self, modem_id, sms_path):
+        self._run(['-m', str(modem_id), f'--messaging-delete-sms={sms_path}'])
+
+    def manager_instance(self):
+        """Identify the running ModemManager, so SMS paths seen before it restarted are read again."""
+        return modemmanager_instance()
+
+    def watch_sms(self, modem_id, callback):
+        """Call callback(path) for every SMS that appears on the modem.
+
+        mmcli has no messaging monitor, so this polls list_sms every
+        inbox_poll_interval seconds.
+        """
+        stopped = threading.Event()
+        try:
+            known = set(self.list_sms(modem_id))
+        except ModemError:
+            known = set()
+
+        def run():
+            nonlocal known
+            while not stopped.wait(inbox_poll_interval):
+                try:
+                    paths = self.list_sms(modem_id)
+                except ModemError as e:
+                    print(f"Error listing SMS: {e}")
+                    continue
+                for p in paths:
+                    if p not in known:
+                        try:
+                            callback(p)
+                        except Exception as e:  # one bad message must not end the watcher
+                            print(f"Error handling SMS {p}: {e}", file=sys.stderr)
+                known = set(paths)
+        return Watcher(run, stopped.set)
+
+    def watch_modem(self, modem_id, callback):
+        """mmcli offers no property change notifications; returns None."""
+        return None
+
+    def watch_modems(self, callback):
+        """mmcli offers no hot-plug notifications; returns None."""
+        return None
+
+    def close(self):
+        pass
+
+class DbusBackend:
+    """Modem operations as direct calls to ModemManager over one long-lived D-Bus connection.
+
+    Needs the optional jeepney package. bus is 'SYSTEM', 'SESSION' (for a mock
+    ModemManager, see bench/mock_modemmanager.py) or a D-Bus address.
+    """
+
+    name = 'dbus'
+    service = 'org.freedesktop.ModemManager1'
+    root = '/org/freedesktop/ModemManager1'
+    modem_iface = 'org.freedesktop.ModemManager1.Modem'
+    messaging_iface = 'org.freedesktop.ModemManager1.Modem.Messaging'
+    sms_iface = 'org.freedesktop.ModemManager1.Sms'
+    # MMModemState and MMSmsState values, named like mmcli prints them
+    modem_states = {
+        -1: 'failed', 0: 'unknown', 1: 'initializing', 2: 'locked', 3: 'disabled', 4: 'disabling',
+        5: 'enabling', 6: 'enabled', 7: 'searching', 8: 'registered', 9: 'disconnecting',
+        10: 'connecting', 11: 'connected',
+    }
+    sms_states = {0: 'unknown', 1: 'stored', 2: 'receiving', 3: 'received', 4: 'sending', 5: 'sent'}
+
+    def __init__(self, bus='SYSTEM', timeout=30):
+        from jeepney.io.threading import open_dbus_connection, DBusRouter
+        self.timeout = timeout
+        self._router = DBusRouter(open_dbus_connection(bus=bus))
+        try:
+            self._call(self.root, 'org.freedesktop.DBus.Peer', 'Ping')
+        except ModemError:
+            self.close()
+            raise
+
+    def _call(self, path, interface, method, signature=None, body=()):
+        from jeepney import DBusAddress, DBusErrorResponse, new_method_call
+        from jeepney.wrappers import unwrap_msg
+        addr = DBusAddress(path, bus_name=self.service, interface=interface)
+        try:
+            reply = self._router.send_and_get_reply(new_method_call(addr, method, signature, body), timeout=self.timeout)
+            return unwrap_msg(reply)
+        except DBusErrorResponse as e:
+            raise ModemError(f"D-Bus error: {e.name}: {' '.join(map(str, e.data))}") from e
+        except (OSError, TimeoutError) as e:
+            raise ModemError(f"D-Bus error: {e}") from e
+
+    def _properties(self, path, interface):
+        props = self._call(path, 'org.freedesktop.DBus.Properties', 'GetAll', 's', (interface,))[0]
+        return {k: v[1] for k, v in props.items()}
+
+    def _modem_path(self, modem_id):
+        return f"{self.root}/Modem/{modem_id}"
+
+    def list_modems(self):
+        objects = self._call(self.root, 'org.freedesktop.DBus.ObjectManager', 'GetManagedObjects')[0]
+        ids = [p.rstrip('/').split('/')[-1] for p, ifaces in objects.items() if self.modem_iface in ifaces]
+        return sorted(ids, key=lambda i: int(i) if i.isdigit() else i)
+
+    def modem_info(self, modem_id):
+        props = self._properties(self._modem_path(modem_id), self.modem_iface)
+        quality = props.get('SignalQuality')
+        return {
+            'own_numbers': list(props.get('OwnNumbers') or []),
+            'state': self.modem_states.get(props.get('State'), 'unknown'),
+            'signal_quality': quality[0] if quality else None,
+        }
+
+    def set_enabled(self, modem_id, enable=True):
+        self._call(self._modem_path(modem_id), self.modem_iface, 'Enable', 'b', (enable,))
+
+    def create_sms(self, modem_id, tel, message):
+        props = {'text': ('s', message), 'number': ('s', tel)}
+        return self._call(self._modem_path(modem_id), self.messaging_iface, 'Create', 'a{sv}', (props,))[0]
+
+    def send_sms(self, sms_path):
+        self._call(sms_path, self.sms_iface, 'Send')
+
+    def list_sms(self, modem_id):
+        return list(self._call(self._modem_path(modem_id), self.messaging_iface, 'List')[0])
+
+    def read_sms(self, sms_path):
+        props = self._properties(sms_path, self.sms_iface)
+        return {
+            'path': sms_path,
+            'number': props.get('Number') or None,
+            'text': props.get('Text') or None,
+            'timestamp': props.get('Timestamp') or None,
+            'state': self.sms_states.get(props.get('State'), 'unknown'),
+            'raw': props,
+        }
+
+    def read_sms_many(self, paths, concurrency):
+        results = []
+        for p in paths:
+            try:
+                results.append((p, self.read_sms(p), ''))
+            except ModemError as e:
+                results.append((p, None, str(e)))
+        return results
+
+    def delete_sms(self, modem_id, sms_path):
+        self._call(self._modem_path(modem_id), self.messaging_iface, 'Delete', 'o', (sms_path,))
+
+    def manager_instance(self):
+        """ModemManager's unique bus name, which changes when it restarts."""
+        from jeepney import DBusErrorResponse
+        from jeepney.bus_messages import message_bus
+        from jeepney.wrappers import unwrap_msg
+        try:
+            return unwrap_msg(self._router.send_and_get_reply(message_bus.GetNameOwner(self.service), timeout=self.timeout))[0]
+        except (DBusErrorResponse, OSError, TimeoutError):
+            return None  # unknown: paths are then remembered as from any run
+
+    def _watch_signal(self, rule, handler):
+        import queue
+        from jeepney.bus_messages import message_bus
+        events = queue.Queue()
+        handle = self._router.filter(rule, queue=events)
+        try:
+            self._router.send_and_get_reply(message_bus.AddMatch(rule), timeout=self.timeout)
+        except (OSError, TimeoutError) as e:
+            handle.close()
+            raise ModemError(f"D-Bus error: {e}") from e
+
+        def run():
+            while True:
+                msg = events.get()
+                if msg is None:
+                    return
+                try:
+                    handler(msg)
+                except Exception as e:  # one bad signal must not end the watcher
+                    print(f"Error handling D-Bus signal: {e}", file=sys.stderr)
+
+        def stop():
+            handle.close()
+            events.put(None)
+            try:
+                self._router.send_and_get_reply(message_bus.RemoveMatch(rule), timeout=self.timeout)
+            except (OSError, TimeoutError):
+                pass
+        return Watcher(run, stop)
+
+    def watch_sms(self, modem_id, callback):
+        """Call callback(path) for every SMS the modem receives, from its Messaging.Added signal.
+
+        The watcher thread blocks on the signal queue and does no work while idle.
+        """
+        from jeepney import MatchRule
+        rule = MatchRule(type='signal', interface=self.messaging_iface, member='Added', path=self._modem_path(modem_id))
+
+        def on_added(msg):
+            path, received = msg.body
+            if received:
+                callback(path)
+        return self._watch_signal(rule, on_added)
+
+    def watch_modem(self, modem_id, callback):
+        """Call callback() whenever a property of the modem changes."""
+        from jeepney import MatchRule
+        rule = MatchRule(type='signal', interface='org.freedesktop.DBus.Properties', member='PropertiesChanged',
+                         path=self._modem_path(modem_id))
+        return self._watch_signal(rule, lambda msg: callback())
+
+    def watch_modems(self, callback):
+        """Call callback() whenever a modem is added or removed."""
+        from jeepney import MatchRule
+        rule = MatchRule(type='signal', interface='org.freedesktop.DBus.ObjectManager', path=self.root)
+        return self._watch_signal(rule, lambda msg: callback())
+
+    def close(self):
+        self._router.close()
+
+_backend = None
+_backend_lock = threading.Lock()
+
+def open_backend(name=None):
+    """Open the named backend ('dbus', 'mmcli' or 'auto': D-Bus if reachable, else mmcli)."""
+    name = name or modem_backend
+    if name in ('dbus', 'auto'):
+        try:
+            return DbusBackend(dbus_bus)
+        except (ImportError, OSError, ModemError) as e:
+            if name == 'dbus':
+                raise ModemError(f"D-Bus backend unavailable: {e}") from e
+    return MmcliBackend()
+
+def get_backend():
+    """Return the process-wide modem backend, opening it on first use."""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = open_backend()
+        return _backend
+
+def close_backend():
+    global _backend
+    with _backend_lock:
+        if _modem_pool is not None:
+            _modem_pool.stop()
+        for watcher in _modem_watchers.values():
+            watcher.stop()
+        _modem_watchers.clear()
+        invalidate_modem_status()
+        if _backend is not None:
+            _backend.close()
+            _backend = None
+
+atexit.register(close_backend)
+
+def print_modem_error(e):
+    print(e)
+    if e.stdout:
+        print(e.stdout)
+    if e.stderr:
+        print(e.stderr)
+
+def get_modem_id():
+    try:
+        ids = get_backend().list_modems()
+        if not ids:
+            print("No modems found.")
+            return None
+        return ids[0]
+    except ModemError as e:
+        print(f"Error listing modems: {e}")
+        return None
+
+_modem_status = {}  # modem id -> (time.monotonic() when read, backend modem_info dict)
+_modem_status_lock = threading.Lock()
+_modem_watchers = {}
+
+def get_modem_status(modem_id, max_age=None):
+    """Return the backend's modem_info for the modem, reusing a copy read less than max_age seconds ago.
+
+    max_age defaults to modem_info_ttl. The menu, the send path and the
+    daemon all share this cache. Raises ModemError.
+    """
+    max_age = modem_info_ttl if max_age is None else max_age
+    key = str(modem_id)
+    with _modem_status_lock:
+        cached = _modem_status.get(key)
+    if cached and time.monotonic() - cached[0] < max_age:
+        return cached[1]
+    info = get_backend().modem_info(modem_id)
+    modem_enabled_metric.set(int(info['state'] in PooledModem.usable_states), key)
+    with _modem_status_lock:
+        _modem_status[key] = (time.monotonic(), info)
+    return info
+
+def invalidate_modem_status(modem_id=None):
+    """Drop the cached status of one modem, or of every modem."""
+    with _modem_status_lock:
+        if modem_id is None:
+            _modem_status.clear()
+        else:
+            _modem_status.pop(str(modem_id), None)
+
+def watch_modem_status(modem_id):
+    """Invalidate the modem's cached status whenever ModemManager reports a change.
+
+    Only the D-Bus backend supports this; returns False otherwise.
+    """
+    key = str(modem_id)
+    if key in _modem_watchers:
+        return True
+    watcher = get_backend().watch_modem(modem_id, lambda: invalidate_modem_status(key))
+    if watcher is None:
+        return False
+    _modem_watchers[key] = watcher
+    return True
+
+def get_modem_info(modem_id):
+    """Return (tel, enabled) for the given modem id, or None on error."""
+    try:
+        info = get_modem_status(modem_id)
+        own_numbers = info['own_numbers']
+        tel = own_numbers[0] if own_numbers else None
+        enabled = (info['state'] == 'enabled')
+        return tel, enabled
+    except ModemError as e:
+        print(f"Error reading modem {modem_id}: {e}")
+        return None
+
+def set_modem_enabled(modem_id, enable=True):
+    """Enable or disable the modem."""
+    try:
+        get_backend().set_enabled(modem_id, enable)
+        modem_enabled_metric.set(int(enable), str(modem_id))
+        print("Modem enabled." if enable else "Modem disabled.")
+        return True
+    except ModemError as e:
+        print(f"Error changing modem state: {e}")
+        return False
+    finally:
+        invalidate_modem_status(modem_id)
+
+def deliver_sms(modem_id, tel, message):
+    """Create and send an SMS, then record it in history and messages. Returns its path.
+
+    Raises ModemError; send_sms is the variant that prints instead.
+    """
+    backend = get_backend()
+    try:
+        sms_path = backend.create_sms(modem_id, tel, message)
+        # send the created SMS
+        backend.send_sms(sms_path)
+    except ModemError:
+        # the modem may have gone away or changed state
+        invalidate_modem_status(modem_id)
+        sms_failed_metric.inc(str(modem_id))
+        raise
+    record_sent(modem_id, tel, message, sms_path)
+    return sms_path
+
+def record_sent(modem_id, tel, message, sms_path):
+    """Add a sent SMS to history and to the messages table."""
+    sms_sent_metric.inc(str(modem_id))
+    timestamp = datetime.now().isoformat()
+    add_history(tel, timestamp)
+    add_messages([('out', tel, message, timestamp, 'sent', str(modem_id), sms_path)])
+
+def send_sms(modem_id, tel, message):
+    """Send an SMS using the specified modem.
+
+    Creates the SMS object on the modem, then sends it (with the mmcli backend:
+    mmcli --messaging-create-sms="text='...',number='...'" followed by
+    mmcli -s <path> --send). Records number in history on success.
+    """
+    try:
+        deliver_sms(modem_id, tel, message)
+        print("SMS sent successfully.")
+        return True
+    except ModemError as e:
+        print_modem_error(e)
+        return False
+    except Exception as e:
+        print(f"Unexpected error sending SMS: {e}")
+        return False
+
+class PooledModem:
+    """Health and load counters of one modem in a ModemPool."""
+
+    usable_states = ('enabled', 'registered', 'connected')
+
+    def __init__(self, modem_id):
+        self.id = modem_id
+        self.state = None
+        self.signal_quality = None
+        self.in_flight = 0
+        self.sent = 0
+        self.failed = 0
+        self.failures_in_a_row = 0
+        self.retry_at = 0.0
+        self.window_start = time.monotonic()
+        self.window_sent = 0
+
+    def healthy(self, now):
+        return self.state in self.usable_states and (self.failures_in_a_row < ModemPool.max_failures or now >= self.retry_at)
+
+    def quota_left(self, quota, period, now):
+        if quota is None:
+            return float('inf')
+        if now - self.window_start >= period:
+            self.window_start, self.window_sent = now, 0
+        return quota - self.window_sent
+
+class ModemPool:
+    """Every modem ModemManager knows about, with per-modem health and load, for spreading sends.
+
+    strategy is 'round_robin', 'least_loaded' (fewest sends in flight, then
+    best signal) or 'quota' (most of the per-SIM quota left). With a quota,
+    a modem that used up its sends for the current period is skipped by every
+    strategy. A modem that fails max_failures sends in a row rests for
+    failure_cooldown seconds. New and removed modems are picked up on
+    refresh(), which runs every refresh_interval seconds and, with the D-Bus
+    backend, whenever ModemManager adds or removes a modem.
+    """
+
+    max_failures = 3
+    failure_cooldown = 60.0
+
+    def __init__(self, strategy=None, quota=None, quota_period=None, refresh_interval=30.0):
+        self.strategy = strategy or pool_strategy
+        if self.strategy not in ('round_robin', 'least_loaded', 'quota'):
+            raise ValueError(f"unknown pool strategy: {self.strategy}")
+        self.quota = quota if quota is not None else pool_quota
+        self.quota_period = quota_period or pool_quota_period
+        self.refresh_interval = refresh_interval
+        self.modems = {}
+        self._lock = threading.Lock()
+        self._next = 0
+        self._refreshed = 0.0
+        self._stale = True
+        self._watcher = None
+
+    def __len__(self):
+        return len(self.modems)
+
+    def start_watching(self):
+        """Refresh on ModemManager hot-plug signals when the backend supports them."""
+        if self._watcher is None:
+            self._watcher = get_backend().watch_modems(self.mark_stale)
+        return self._watcher is not None
+
+    def stop(self):
+        if self._watcher is not None:
+            self._watcher.stop()
+            self._watcher = None
+
+    def mark_stale(self):
+        self._stale = True
+        invalidate_modem_status()
+
+    def refresh(self):
+        """Rediscover modems and re-read their state and signal quality."""
+        ids = get_backend().list_modems()
+        statuses = {}
+        for modem_id in ids:
+            try:
+                statuses[modem_id] = get_modem_status(modem_id)
+            except ModemError as e:
+                print(f"Error reading modem {modem_id}: {e}")
+        with self._lock:
+            for gone in set(self.modems) - set(ids):
+                del self.modems[gone]
+            for modem_id in ids:
+                modem = self.modems.setdefault(modem_id, PooledModem(modem_id))
+                status = statuses.get(modem_id)
+                modem.state = status['state'] if status else None
+                modem.signal_quality = status['signal_quality'] if status else None
+            self._refreshed = time.monotonic()
+            self._stale = False
+
+    def acquire(self):
+        """Pick a modem for one send and count it as in flight. Returns its id, or None."""
+        now = time.monotonic()
+        if self._stale or now - self._refreshed >= self.refresh_interval:
+            try:
+                self.refresh()
+            except ModemError as e:
+                print(f"Error listing modems: {e}")
+        with self._lock:
+            candidates = [m for m in self.modems.values()
+                          if m.healthy(now) and m.quota_left(self.quota, self.quota_period, now) > 0]
+            if not candidates:
+                return None
+            if self.strategy == 'least_loaded':
+                modem = min(candidates, key=lambda m: (m.in_flight, -(m.signal_quality or 0)))
+            elif self.strategy == 'quota':
+                modem = max(candidates, key=lambda m: (m.quota_left(self.quota, self.quota_period, now), -m.in_flight))
+            else:
+                modem = candidates[self._next % len(candidates)]
+                self._next += 1
+            modem.in_flight += 1
+            modem.window_sent += 1
+            return modem.id
+
+    def release(self, modem_id, ok):
+        """Record the outcome of a send started with acquire()."""
+        with self._lock:
+            modem = self.modems.get(modem_id)
+            if modem is None:
+                return  # unplugged meanwhile
+            modem.in_flight -= 1
+            if ok:
+                modem.sent += 1
+                modem.failures_in_a_row = 0
+            else:
+                modem.failed += 1
+                modem.failures_in_a_row += 1
+                if modem.failures_in_a_row >= self.max_failures:
+                    modem.retry_at = time.monotonic() + self.failure_cooldown
+
+    def send(self, tel, message):
+        """Send an SMS through the modem the strategy picks. Returns True on success."""
+        modem_id = self.acquire()
+        if modem_id is None:
+            print("No modem available.")
+            return False
+        ok = False
+        try:
+            ok = send_sms(modem_id, tel, message)
+        finally:
+            self.release(modem_id, ok)
+        return ok
+
+    def stats(self):
+        """Return a dict of counters per modem."""
+        with self._lock:
+            return {m.id: {'state': m.state, 'signal_quality': m.signal_quality, 'in_flight': m.in_flight,
+                           'sent': m.sent, 'failed': m.failed, 'window_sent': m.window_sent}
+                    for m in self.modems.values()}
+
+_modem_pool = None
+_modem_pool_lock = threading.Lock()
+
+def get_modem_pool():
+    """Return the process-wide ModemPool, creating it on first use."""
+    global _modem_pool
+    with _modem_pool_lock:
+        if _modem_pool is None:
+            _modem_pool = ModemPool()
+            try:
+                _modem_pool.start_watching()
+            except ModemError:
+                pass  # refresh_interval still picks up hot-plugged modems
+        return _modem_pool
+
+def send_sms_pooled(tel, message):
+    """Send an SMS through whichever modem of the pool is picked by pool_strategy."""
+    return get_modem_pool().send(tel, message)
+
+class TokenBucket:
+    """Allows `rate` operations per second on average, in bursts of up to `burst`."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst or max(1.0, rate)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available, then take it."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+def carrier_of(tel):
+    """Return the carrier of a number by longest matching prefix in carrier_prefixes, or None."""
+    for length in range(len(tel), 0, -1):
+        carrier = carrier_prefixes.get(tel[:length])
+        if carrier:
+            return carrier
+    return None
+
+def read_bulk_file(f):
+    """Yield (number, text) pairs from CSV lines 'number,text'; unquoted commas stay in the text."""
+    import csv
+    for row in csv.reader(f):
+        if not row or not row[0].strip() or row[0].startswith('#'):
+            continue
+        yield row[0].strip(), ','.join(row[1:]).strip()
+
+def send_bulk(items, workers=None, modem_rate=None, carrier_rate=None, pool=None, progress=True):
+    """Send every (number, text) pair from an iterable through a pool of worker threads.
+
+    Items are read lazily through a bounded queue, so the iterable may be a
+    large file or generator. modem_rate and carrier_rate cap messages per
+    second on each modem and for each carrier (see carrier_of). Prints
+    progress about once a second unless progress is False, and returns a
+    summary dict with sent/failed counts, failures, elapsed time and
+    messages per minute.
+    """
+    workers = workers or bulk_workers
+    modem_rate = modem_rate if modem_rate is not None else bulk_modem_rate
+    carrier_rate = carrier_rate if carrier_rate is not None else bulk_carrier_rate
+    pool = pool or get_modem_pool()
+    buckets = {}
+    buckets_lock = threading.Lock()
+    summary = {'sent': 0, 'failed': 0, 'failures': []}
+    summary_lock = threading.Lock()
+    import queue
+    pending = queue.Queue(maxsize=workers * 4)
+    start = time.monotonic()
+
+    def bucket(key, rate):
+        with buckets_lock:
+            if key not in buckets:
+                buckets[key] = TokenBucket(rate)
+            return buckets[key]
+
+    def send_one(tel, text):
+        carrier = carrier_of(tel)
+        if carrier_rate and carrier:
+            bucket(('carrier', carrier), carrier_rate).acquire()
+        modem_id = pool.acquire()
+        if modem_id is None:
+            return "no modem available"
+        ok = False
+        try:
+            if modem_rate:
+                bucket(('modem', modem_id), modem_rate).acquire()
+            deliver_sms(modem_id, tel, text)
+            ok = True
+            return None
+        except ModemError as e:
+            return str(e)
+        finally:
+            pool.release(modem_id, ok)
+
+    def worker():
+        while True:
+            item = pending.get()
+            if item is None:
+                return
+            try:
+                error = send_one(*item)
+            except Exception as e:
+                # e.g. the database failed while recording the send; a dead
+                # worker would leave the feeding loop blocked on pending.put
+                error = f"unexpected error: {e}"
+            with summary_lock:
+                if error is None:
+                    summary['sent'] += 1
+                else:
+                    summary['failed'] += 1
+                    summary['failures'].append((item[0], error))
+
+    reported = False
+
+    def report():
+        nonlocal reported
+        reported = True
+        elapsed = time.monotonic() - start
+        done = summary['sent'] + summary['failed']
+        rate = done / elapsed * 60 if elapsed else 0.0
+        print(f"\rSent: {summary['sent']}  Failed: {summary['failed']}  Rate: {rate:.0f}/min", end='', flush=True)
+
+    threads = [threading.Thread(target=worker, name=f'bulk-{i}', daemon=True) for i in range(workers)]
+    for t in threads:
+        t.start()
+    last_report = start
+    for item in items:
+        pending.put(item)
+        if progress and time.monotonic() - last_report >= 1.0:
+            report()
+            last_report = time.monotonic()
+    for _ in threads:
+        pending.put(None)
+    for t in threads:
+        while t.is_alive():
+            t.join(1.0)
+            if progress and t.is_alive():
+                report()
+    if reported:
+        print()
+    summary['elapsed'] = time.monotonic() - start
+    summary['per_minute'] = (summary['sent'] + summary['failed']) / summary['elapsed'] * 60 if summary['elapsed'] else 0.0
+    return summary
+
+def latency_summary(values):
+    """Return count, mean, p50, p99 and max of a list of seconds, in milliseconds."""
+    if not values:
+        return {'count': 0, 'mean_ms': 0.0, 'p50_ms': 0.0, 'p99_ms': 0.0, 'max_ms': 0.0}
+    ordered = sorted(values)
+    pick = lambda p: ordered[min(len(ordered) - 1, int(len(ordered) * p))] * 1000
+    return {'count': len(ordered), 'mean_ms': sum(ordered) / len(ordered) * 1000,
+            'p50_ms': pick(0.50), 'p99_ms': pick(0.99), 'max_ms': ordered[-1] * 1000}
+
+class SmsPipeline:
+    """Two-stage send pipeline for one modem.
+
+    A creator thread creates SMS objects ahead of time into a bounded queue
+    of `depth` entries while a sender thread transmits them, so the modem is
+    not left idle while the next SMS is created. on_result(tel, error) is
+    called for every item, with error None on success. metrics() reports
+    create/send latency, time spent queued, sender idle time and queue depth.
+    """
+
+    def __init__(self, modem_id, depth=None, on_result=None, rate=None):
+        self.modem_id = modem_id
+        self.depth = depth or pipeline_depth
+        self.on_result = on_result
+        self.bucket = TokenBucket(rate) if rate else None
+        import queue
+        self._incoming = queue.Queue(maxsize=self.depth)
+        self._created = queue.Queue(maxsize=self.depth)
+        self._create_latency = []
+        self._send_latency = []
+        self._queued = []
+        self._idle = []
+        self._depth_samples = []
+        self._threads = [threading.Thread(target=self._create_loop, name=f'pipeline-create-{modem_id}', daemon=True),
+                         threading.Thread(target=self._send_loop, name=f'pipeline-send-{modem_id}', daemon=True)]
+        for t in self._threads:
+            t.start()
+
+    def depth_now(self):
+        return self._incoming.qsize() + self._created.qsize()
+
+    def submit(self, tel, message):
+        """Queue a message; blocks while the pipeline is full."""
+        self._incoming.put((tel, message))
+
+    def close(self):
+        """Finish every submitted message and stop both stages."""
+        self._incoming.put(None)
+        for t in self._threads:
+            t.join()
+
+    def _result(self, tel, error):
+        if self.on_result:
+            self.on_result(tel, error)
+
+    def _create_loop(self):
+        backend = get_backend()
+        while True:
+            item = self._incoming.get()
+            if item is None:
+                self._created.put(None)
+                return
+            tel, message = item
+            start = time.monotonic()
+            try:
+                sms_path = backend.create_sms(self.modem_id, tel, message)
+            except ModemError as e:
+                invalidate_modem_status(self.modem_id)
+                sms_failed_metric.inc(str(self.modem_id))
+                self._result(tel, str(e))
+                continue
+            except Exception as e:
+                self._result(tel, f"unexpected error: {e}")
+                continue
+            created = time.monotonic()
+            self._create_latency.append(created - start)
+            self._created.put((tel, message, sms_path, created))
+
+    def _send_loop(self):
+        backend = get_backend()
+        idle_since = time.monotonic()
+        while True:
+            self._depth_samples.append(self._created.qsize())
+            item = self._created.get()
+            if item is None:
+                return
+            tel, message, sms_path, created = item
+            if self.bucket:
+                self.bucket.acquire()
+            start = time.monotonic()
+            self._idle.append(start - idle_since)
+            self._queued.append(start - created)
+            try:
+                backend.send_sms(sms_path)
+            except ModemError as e:
+                invalidate_modem_status(self.modem_id)
+                sms_failed_metric.inc(str(self.modem_id))
+                try:
+                    backend.delete_sms(self.modem_id, sms_path)  # don't leave the draft in modem storage
+                except ModemError:
+                    pass
+                self._result(tel, str(e))
+            else:
+                self._send_latency.append(time.monotonic() - start)
+                # the loop must survive, or the creator blocks on a full _created and close() never returns
+                try:
+                    record_sent(self.modem_id, tel, message, sms_path)
+                except Exception as e:
+                    self._result(tel, f"unexpected error: {e}")
+                else:
+                    self._result(tel, None)
+            idle_since = time.monotonic()
+
+    def metrics(self):
+        depths = self._depth_samples
+        return {
+            'create': latency_summary(self._create_latency),
+            'send': latency_summary(self._send_latency),
+            'queued': latency_summary(self._queued),
+            'sender_idle': latency_summary(self._idle[1:]),  # the first wait is pipeline fill
+            'queue_depth': {'mean': sum(depths) / len(depths) if depths else 0.0, 'max': max(depths, default=0)},
+        }
+
+def send_pipelined(items, modem_ids=None, depth=None, modem_rate=None, progress=True):
+    """Send (number, text) pairs through one SmsPipeline per modem.
+
+    Each item goes to the pipeline with the fewest queued messages.
+    modem_ids defaults to the usable modems of the shared pool. Returns the
+    send_bulk summary plus a 'pipelines' entry with per-modem metrics.
+    """
+    if modem_ids is None:
+        pool = get_modem_pool()
+        pool.refresh()
+        modem_ids = [m.id for m in pool.modems.values() if m.healthy(time.monotonic())]
+    summary = {'sent': 0, 'failed': 0, 'failures': []}
+    if not modem_ids:
+        print("No modem available.")
+        summary.update(elapsed=0.0, per_minute=0.0, pipelines={})
+        return summary
+    lock = threading.Lock()
+
+    def on_result(tel, error):
+        with lock:
+            if error is None:
+                summary['sent'] += 1
+            else:
+                summary['failed'] += 1
+                summary['failures'].append((tel, error))
+
+    start = time.monotonic()
+    pipelines = [SmsPipeline(m, depth, on_result, modem_rate) for m in modem_ids]
+    last_report = start
+    for tel, message in items:
+        min(pipelines, key=SmsPipeline.depth_now).submit(tel, message)
+        if progress and time.monotonic() - last_report >= 1.0:
+            print(f"\rSent: {summary['sent']}  Failed: {summary['failed']}", end='', flush=True)
+            last_report = time.monotonic()
+    for p in pipelines:
+        p.close()
+    if progress and last_report != start:
+        print()
+    summary['elapsed'] = time.monotonic() - start
+    summary['per_minute'] = (summary['sent'] + summary['failed']) / summary['elapsed'] * 60 if summary['elapsed'] else 0.0
+    summary['pipelines'] = {p.modem_id: p.metrics() for p in pipelines}
+    return summary
+
+def print_pipeline_metrics(pipelines):
+    for modem_id, m in pipelines.items():
+        print(f"Modem {modem_id}: queue depth mean {m['queue_depth']['mean']:.1f} max {m['queue_depth']['max']}")
+        for stage in ('create', 'send', 'queued', 'sender_idle'):
+            s = m[stage]
+            print(f"  {stage:<12} mean {s['mean_ms']:8.1f} ms  p50 {s['p50_ms']:8.1f} ms  p99 {s['p99_ms']:8.1f} ms")
+
+def print_bulk_summary(summary):
+    print(f"Sent: {summary['sent']}  Failed: {summary['failed']}  Time: {summary['elapsed']:.1f}s  Rate: {summary['per_minute']:.0f}/min")
+    for tel, error in summary['failures']:
+        print(f"  {tel}: {error}")
+
+# Set when messages are queued so idle outbox workers pick them up at once.
+_outbox_ready = threading.Event()
+
+def enqueue_sms(tel, message, modem_id=None, worker=None):
+    """Add a message to the outbox and return its id. modem_id None lets the pool pick.
+
+    With worker, the message is inserted already claimed by that worker and
+    drainers are not woken: the caller sends it with process_outbox_item.
+    """
+    return enqueue_many([(tel, message)], modem_id, worker)[0]
+
+def enqueue_many(items, modem_id=None, worker=None):
+    """Add (number, text) pairs to the outbox in one transaction. Returns their ids.
+
+    With worker, they are inserted claimed by it, as with enqueue_sms.
+    """
+    now = time.time()
+    modem = None if modem_id is None else str(modem_id)
+    if worker:
+        sql = ("INSERT INTO outbox (tel, text, modem, state, attempts, lease_owner, lease_until, next_attempt_at, created_at, updated_at) "
+               "VALUES (?, ?, ?, 'creating', 1, ?, ?, ?, ?, ?);")
+        rows = ((tel, text, modem, worker, now + outbox_lease, now, now, now) for tel, text in items)
+    else:
+        sql = "INSERT INTO outbox (tel, text, modem, state, next_attempt_at, created_at, updated_at) VALUES (?, ?, ?, 'queued', ?, ?, ?);"
+        rows = ((tel, text, modem, now, now, now) for tel, text in items)
+    conn = get_db()
+    with DbTransaction(conn):
+        cur = conn.executemany(sql, rows)
+        # AUTOINCREMENT ids are consecutive while this transaction holds the write lock
+        last = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'outbox';").fetchone()
+    if not worker:
+        _outbox_ready.set()
+    if cur.rowcount <= 0:
+        return []
+    return list(range(last[0] - cur.rowcount + 1, last[0] + 1))
+
+def outbox_worker_id():
+    return f"{os.uname().nodename}:{os.getpid()}:{threading.get_ident()}"
+
+def claim_outbox(worker, limit=1, ids=None):
+    """Lease up to `limit` due messages to a worker and mark them 'creating'. Returns the claimed rows.
+
+    BEGIN IMMEDIATE makes the select-and-update atomic between processes, so
+    several workers can drain the outbox at once without sending twice. With
+    ids, only those messages are claimed, due or not.
+    """
+    now = time.time()
+    conn = get_db()
+    conn.execute("BEGIN IMMEDIATE;")
+    try:
+        if ids:
+            rows = conn.execute(
+                f"SELECT id FROM outbox WHERE state = 'queued' AND id IN ({', '.join('?' * len(ids))});", tuple(ids)).fetchall()
+        else:
+            rows = conn.execute(
+                "SELECT id FROM outbox WHERE state = 'queued' AND next_attempt_at <= ? ORDER BY next_attempt_at, id LIMIT ?;",
+                (now, limit)).fetchall()
+        claimed = [row['id'] for row in rows]
+        conn.executemany(
+            "UPDATE outbox SET state = 'creating', lease_owner = ?, lease_until = ?, attempts = attempts + 1, updated_at = ? WHERE id = ?;",
+            ((worker, now + outbox_lease, now, i) for i in claimed))
+        commit_db(conn)
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+    if not claimed:
+        return []
+    return query_db(f"SELECT * FROM outbox WHERE id IN ({', '.join('?' * len(claimed))}) ORDER BY id;", claimed)
+
+def update_outbox(msg_id, worker, **fields):
+    """Update a leased message. Returns False, changing nothing, if the lease was lost to recovery."""
+    fields['updated_at'] = time.time()
+    assignments = ', '.join(f"{k} = ?" for k in fields)
+    conn = get_db()
+    with DbTransaction(conn):
+        cur = conn.execute(f"UPDATE outbox SET {assignments} WHERE id = ? AND lease_owner = ?;", (*fields.values(), msg_id, worker))
+    return cur.rowcount == 1
+
+def outbox_backoff(attempts):
+    """Seconds to wait before retry number `attempts`: exponential with jitter, capped."""
+    import random
+    delay = min(outbox_backoff_max, outbox_backoff_base * 2 ** (attempts - 1))
+    return delay * random.uniform(0.8, 1.2)
+
+def process_outbox_item(row, worker, pool=None):
+    """Create and send one claimed outbox message. Returns None on success, else the error text."""
+    backend = get_backend()
+    if not row['modem']:
+        pool = pool or get_modem_pool()
+    modem_id = row['modem'] or pool.acquire()
+    if modem_id is None:
+        error = "no modem available"
+        update_outbox(row['id'], worker, state='queued', lease_owner=None, lease_until=None,
+                      next_attempt_at=time.time() + outbox_backoff(row['attempts']), last_error=error)
+        return error
+    sms_path = None
+    ok = False
+    try:
+        sms_path = backend.create_sms(modem_id, row['tel'], row['text'])
+        if not update_outbox(row['id'], worker, state='sending', modem=str(modem_id), sms_path=sms_path,
+                             lease_until=time.time() + outbox_lease):
+            # recovered by another worker, which sends it now
+            try:
+                backend.delete_sms(modem_id, sms_path)
+            except ModemError:
+                pass
+            return "lease lost to another worker, not sent"
+        backend.send_sms(sms_path)
+        ok = True
+    except ModemError as e:
+        invalidate_modem_status(modem_id)
+        sms_failed_metric.inc(str(modem_id))
+        if sms_path:
+            try:
+                backend.delete_sms(modem_id, sms_path)  # don't leave the draft in modem storage
+            except ModemError:
+                pass
+        if row['attempts'] >= outbox_max_attempts:
+            update_outbox(row['id'], worker, state='failed', lease_owner=None, lease_until=None, last_error=str(e))
+        else:
+            update_outbox(row['id'], worker, state='queued', lease_owner=None, lease_until=None, sms_path=None,
+                          next_attempt_at=time.time() + outbox_backoff(row['attempts']), last_error=str(e))
+        return str(e)
+    finally:
+        if not row['modem']:
+            pool.release(modem_id, ok)
+    if update_outbox(row['id'], worker, state='sent', lease_owner=None, lease_until=None, last_error=None):
+        try:
+            record_sent(modem_id, row['tel'], row['text'], sms_path)
+        except (sqlite3.Error, OSError) as e:
+            # the message is sent and marked so; only its history entry is missing
+            print(f"Error recording SMS to {row['tel']} in history: {e}", file=sys.stderr)
+    # else the lease expired mid-send; recovery finds the SMS sent and records it
+    return None
+
+def renew_outbox_leases(worker):
+    """Extend every lease held by worker by outbox_lease seconds."""
+    now = time.time()
+    conn = get_db()
+    with DbTransaction(conn):
+        conn.execute("UPDATE outbox SET lease_until = ? WHERE lease_owner = ? AND state IN ('creating', 'sending');",
+                     (now + outbox_lease, worker))
+
+def send_claimed(ids, worker, workers=1, on_result=None):
+    """Send outbox messages inserted claimed by worker (enqueue_many(..., worker=...)) once, now.
+
+    `workers` threads share the messages; the leases of those still waiting
+    are renewed meanwhile, so no drainer recovers them. on_result(row, error)
+    is called after each attempt, with error None when the message was sent.
+    Messages that fail stay in the outbox for retry.
+    """
+    chunks = iter([ids[i:i + 10] for i in range(0, len(ids), 10)])
+    lock = threading.Lock()
+    done = threading.Event()
+
+    def keep_leases():
+        while not done.wait(outbox_lease / 3):
+            try:
+                renew_outbox_leases(worker)
+            except sqlite3.Error as e:
+                print(f"Error renewing outbox leases: {e}", file=sys.stderr)
+        release_db()
+
+    def work():
+        while True:
+            with lock:
+                chunk = next(chunks, None)
+            if chunk is None:
+                return
+            rows = query_db(f"SELECT * FROM outbox WHERE id IN ({', '.join('?' * len(chunk))}) ORDER BY id;", chunk)
+            for row in rows:
+                error = process_outbox_item(row, worker)
+                if on_result:
+                    on_result(row, error)
+
+    keeper = threading.Thread(target=keep_leases, name='outbox-leases', daemon=True)
+    keeper.start()
+    try:
+        if workers <= 1:
+            work()
+            return
+        threads = [threading.Thread(target=work, name=f'send-{i}') for i in range(workers)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    finally:
+        done.set()
+
+def outbox_state(msg_id):
+    row = query_db("SELECT state FROM outbox WHERE id = ?;", (msg_id,), one=True)
+    return row['state'] if row else None
+
+def outbox_owner_alive(owner):
+    """Whether the process holding an outbox lease may still be running (always True on another host)."""
+    host, _, rest = (owner or '').partition(':')
+    pid = rest.partition(':')[0]
+    if host != os.uname().nodename or not pid.isdigit():
+        return True
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def recover_outbox(force=False):
+    """Return messages whose worker died mid-send to the queue. Returns how many were recovered.
+
+    Only expired leases are touched. With force (at startup), leases held by
+    processes on this host that are gone are recovered too; leases of
+    running workers never are. A message that reached 'sending' may
+    already be on its way: if its SMS object reports 'sent' it is marked
+    sent, otherwise the draft is deleted and the message is sent again.
+    """
+    now = time.time()
+    rows = query_db("SELECT * FROM outbox WHERE state IN ('creating', 'sending')" + ("" if force else " AND lease_until < ?") + ";",
+                    () if force else (now,))
+    rows = [row for row in rows if (row['lease_until'] or 0) < now or not outbox_owner_alive(row['lease_owner'])]
+    backend = get_backend()
+    for row in rows:
+        state = 'queued'
+        if row['state'] == 'sending' and row['sms_path']:
+            try:
+                if backend.read_sms(row['sms_path'])['state'] == 'sent':
+                    state = 'sent'
+                else:
+                    backend.delete_sms(row['modem'], row['sms_path'])
+            except ModemError:
+                pass  # the object is gone; resend rather than lose the message
+        conn = get_db()
+        with DbTransaction(conn):
+            cur = conn.execute(
+                "UPDATE outbox SET state = ?, lease_owner = NULL, lease_until = NULL, next_attempt_at = ?, updated_at = ? "
+                "WHERE id = ? AND state = ? AND lease_owner IS ?;",
+                (state, now, now, row['id'], row['state'], row['lease_owner']))
+        if cur.rowcount != 1:
+            continue  # recovered by another process meanwhile
+        if state == 'sent':
+            record_sent(row['modem'], row['tel'], row['text'], row['sms_path'])
+    return len(rows)
+
+def outbox_counts():
+    """Return the number of outbox messages in each state."""
+    return {row['state']: row['n'] for row in query_db("SELECT state, COUNT(*) AS n FROM outbox GROUP BY state;")}
+
+def drain_outbox(workers=1, stop=None, until_empty=False, quiet=False):
+    """Send outbox messages from `workers` threads until `stop` is set (or the queue is empty).
+
+    Expired leases of crashed workers are recovered every outbox_lease seconds.
+    """
+    stop = stop or threading.Event()
+    recover_outbox()
+    last_recovery = time.monotonic()
+    lock = threading.Lock()
+
+    def work():
+        nonlocal last_recovery
+        worker = outbox_worker_id()
+        while not stop.is_set():
+            try:
+                with lock:
+                    if time.monotonic() - last_recovery >= outbox_lease:
+                        last_recovery = time.monotonic()
+                        recover_outbox()
+                rows = claim_outbox(worker)
+                if not rows:
+                    if until_empty and not query_db(
+                            "SELECT 1 FROM outbox WHERE state IN ('queued', 'creating', 'sending') LIMIT 1;", one=True):
+                        return
+                    _outbox_ready.wait(outbox_poll_interval)
+                    _outbox_ready.clear()
+                    continue
+                for row in rows:
+                    error = process_outbox_item(row, worker)
+                    if not quiet:
+                        print(f"Outbox #{row['id']} to {row['tel']}: " + ("sent." if error is None else f"failed ({error})."))
+            except (sqlite3.Error, OSError) as e:
+                # e.g. the database stayed locked past the busy timeout; a message
+                # left claimed is picked up again once its lease expires
+                print(f"Outbox worker error: {e}", file=sys.stderr)
+                stop.wait(outbox_poll_interval)
+
+    threads = [threading.Thread(target=work, name=f'outbox-{i}', daemon=True) for i in range(workers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+def read_sms_many(paths, concurrency=None):
+    """Read SMS objects, with the mmcli backend running up to `concurrency` processes at once.
+
+    Returns (path, message, raw_output) tuples in the order of paths; message is
+    None when the SMS could not be read or parsed.
+    """
+    if not paths:
+        return []
+    return get_backend().read_sms_many(paths, concurrency or sms_read_concurrency)
+
+def sync_seen_sms(modem_id, sms_paths, run=None):
+    """Return the listed SMS paths not ingested yet, forgetting paths the modem no longer lists.
+
+    ModemManager reuses path numbers once messages are gone, and starts them
+    over when it restarts, so only paths currently on the modem and seen by
+    the same ModemManager run (backend.manager_instance()) are remembered.
+    A message read again is not stored twice: received messages are unique
+    by number, timestamp and text.
+    """
+    modem = str(modem_id)
+    rows = query_db("SELECT path, run FROM sms_seen WHERE modem = ?;", (modem,))
+    seen = {row['path'] for row in rows if row['run'] == run} & set(sms_paths)
+    gone = {row['path'] for row in rows} - seen
+    if gone:
+        conn = get_db()
+        with DbTransaction(conn):
+            conn.executemany("DELETE FROM sms_seen WHERE modem = ? AND path = ?;", ((modem, p) for p in gone))
+    return [p for p in sms_paths if p not in seen]
+
+def ingest_sms(modem_id, messages, run=None):
+    """Store received messages and mark every read path as seen by ModemManager run `run`, in one transaction.
+
+    Returns the received messages that were not stored before.
+    """
+    modem = str(modem_id)
+    now = datetime.now().isoformat()
+    stored = []
+    conn = get_db()
+    with DbTransaction(conn):
+        for m in messages:
+            if m['state'] in ('received', None) and conn.execute(
+                    "INSERT OR IGNORE INTO messages (direction, number, text, timestamp, state, modem, path) VALUES ('in', ?, ?, ?, ?, ?, ?);",
+                    (m['number'], m['text'], m['timestamp'] or '', m['state'], modem, m['path'])).rowcount:
+                stored.append(m)
+        conn.executemany("INSERT OR REPLACE INTO sms_seen (modem, path, ingested_at, run) VALUES (?, ?, ?, ?);",
+                         ((modem, m['path'], now, run) for m in messages))
+    if stored:
+        sms_received_metric.inc(modem, len(stored))
+    return stored
+
+def delete_sms_from_modem(modem_id, path):
+    """Delete a stored SMS from the modem's storage."""
+    try:
+        get_backend().delete_sms(modem_id, path)
+        query_db("DELETE FROM sms_seen WHERE modem = ? AND path = ?;", (str(modem_id), path))
+        return True
+    except ModemError as e:
+        print(f"Error deleting SMS {path}: {e}")
+        return False
+
+def fetch_received_sms(modem_id, delete_after=None):
+    """Read SMS messages the modem received since the last check and store them.
+
+    Only paths missing from the sms_seen table are read from the modem. With
+    delete_after (default: delete_after_ingest) stored messages are deleted
+    from the modem so its storage never fills up. Returns (received,
+    unreadable), the new received messages and (path, raw output) of those
+    that could not be parsed. Raises ModemError.
+    """
+    if delete_after is None:
+        delete_after = delete_after_ingest
+    backend = get_backend()
+    run = backend.manager_instance()
+    new_paths = sync_seen_sms(modem_id, backend.list_sms(modem_id), run)
+    if not new_paths:
+        return [], []
+    messages, unreadable = [], []
+    for p, m, raw in read_sms_many(new_paths):
+        if m is None:
+            unreadable.append((p, raw))
+        else:
+            messages.append(m)
+    # multipart messages still arriving are read again on the next check
+    messages = [m for m in messages if m['state'] != 'receiving']
+    received = ingest_sms(modem_id, messages, run)
+    if delete_after:
+        for m in messages:
+            if m['state'] in ('received', None):
+                delete_sms_from_modem(modem_id, m['path'])
+    return received, unreadable
+
+def check_received_sms(modem_id, delete_after=None):
+    """Fetch new SMS messages with fetch_received_sms and print basic info. Returns the new messages."""
+    try:
+        received, unreadable = fetch_received_sms(modem_id, delete_after)
+    except ModemError as e:
+        print(f"Error listing SMS: {e}")
+        return []
+    for p, raw in unreadable:
+        print(f"Failed to read SMS {p}, printing raw output.")
+        print(raw)
+    # Print summary
+    for i, m in enumerate(received, start=1):
+        print(f"{i}) From: {m['number'] or 'unknown'}  Time: {m['timestamp'] or 'unknown'}  State: {m['state'] or 'unknown'}")
+        print(f"   Text: {m['text'] or '[no text parsed]'}")
+    if not received:
+        print("No new SMS messages.")
+    return received
+
+def watch_inbox(modem_id, on_message=None, delete_after=None):
+    """Store every received SMS as soon as the backend reports it. Returns an Watcher.
+
+    on_message(message) is called after the message is committed. Messages
+    still being received are read again every second until complete.
+    """
+    if delete_after is None:
+        delete_after = delete_after_ingest
+    backend = get_backend()
+
+    def on_added(path, attempt=0):
+        try:
+            m = backend.read_sms(path)
+        except ModemError as e:
+            print(f"Failed to read SMS {path}: {e}")
+            return
+        if m['state'] == 'receiving':
+            if attempt < 60:
+                threading.Timer(1.0, retry, (path, attempt + 1)).start()
+            return
+        stored = ingest_sms(modem_id, [m], backend.manager_instance())
+        if m['state'] not in ('received', None):
+            return
+        if delete_after:
+            delete_sms_from_modem(modem_id, path)
+        if on_message and stored:
+            on_message(m)
+
+    def retry(path, attempt):
+        # runs in its own Timer thread
+        try:
+            on_added(path, attempt)
+        except Exception as e:
+            print(f"Error handling SMS {path}: {e}", file=sys.stderr)
+        finally:
+            release_db()
+
+    return backend.watch_sms(modem_id, on_added)
+
+def print_incoming(m):
+    print(f"From: {m['number'] or 'unknown'}  Time: {m['timestamp'] or 'unknown'}")
+    print(f"   Text: {m['text'] or '[no text parsed]'}")
+
+def prompt_watch_inbox(modem_id):
+    check_received_sms(modem_id)
+    print("Watching for new SMS, press Ctrl+C to stop.")
+    watch = watch_inbox(modem_id, print_incoming)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watch.stop()
+
+def choose_tel_from_history(page_size=20):
+    """Let the user page through history (optionally filtered) and pick a number."""
+    flush_history()
+    cursors = [None]  # keyset cursor of every page shown so far
+    search = None
+    while True:
+        if search:
+            rows = search_history(search, page_size + 1, offset=(len(cursors) - 1) * page_size)
+        else:
+            rows = get_history_page(page_size + 1, cursors[-1])
+        page, has_next = rows[:page_size], len(rows) > page_size
+        if not page and search is None and len(cursors) == 1:
+            print("No history entries.")
+            return None
+        print(f"\n--- History page {len(cursors)}" + (f" (matching '{search}')" if search else '') + " ---")
+        if not page:
+            print("No matching numbers.")
+        for i, row in enumerate(page, start=1):
+            print(f"{i}) {row['tel']}  last: {row['last_message']}  sends: {row['send_count']}")
+        choice = input("Select number index, [n]ext, [p]revious, [s]earch, [q]uit: ").strip().lower()
+        if choice == 'n' and has_next:
+            cursors.append(history_cursor(page[-1]))
+        elif choice == 'p' and len(cursors) > 1:
+            cursors.pop()
+        elif choice == 's':
+            search = input("Search numbers (empty to clear): ").strip() or None
+            cursors = [None]
+        elif choice == 'q':
+            return None
+        elif choice.isdigit() and 1 <= int(choice) <= len(page):
+            return page[int(choice) - 1]['tel']
+        else:
+            print("Invalid selection.")
+
+def prompt_send_sms(modem_id):
+    choice = input("Send SMS - choose: [h]istory / [t]ype: ").strip().lower()
+    if choice == 'h':
+        tel = choose_tel_from_history()
+        if not tel:
+            return
+    else:
+        tel = input("Enter telephone number (with country code, e.g. +48123456789): ").strip()
+        if not tel:
+            print("No number provided.")
+            return
+    message = input("Enter message text: ").strip()
+    if not message:
+        print("No message provided.")
+        return
+    # go through the outbox so a failed or interrupted send is retried; claimed
+    # on insert so the menu's background drainer can't take it from us
+    worker = outbox_worker_id()
+    msg_id = enqueue_sms(tel, message, modem_id, worker)
+    row = query_db("SELECT * FROM outbox WHERE id = ?;", (msg_id,), one=True)
+    error = process_outbox_item(row, worker)
+    if error is None:
+        print("SMS sent successfully.")
+        return
+    print(f"Error sending SMS: {error}")
+    if outbox_state(msg_id) == 'queued':
+        print(f"The message stays in the outbox (#{msg_id}) and will be retried.")
+
+def prompt_search_messages():
+    text = input("Search messages for: ").strip()
+    if not text:
+        print("No search text provided.")
+        return
+    rows = search_messages(text)
+    if not rows:
+        print("No messages found.")
+        return
+    for i, row in enumerate(rows, start=1):
+        arrow = 'To' if row['direction'] == 'out' else 'From'
+        print(f"{i}) {arrow}: {row['number'] or 'unknown'}  Time: {row['timestamp'] or 'unknown'}")
+        print(f"   Text: {row['text'] or '[no text]'}")
+
+def clear_screen():
+    """Clear terminal screen (Linux)."""
+    os.system('clear')
+
+def interactive_menu():
+    modem_id = get_modem_id()
+    if modem_id is None:
+        print("No modem available. Exiting.")
+        return
+    try:
+        watch_modem_status(modem_id)
+    except ModemError:
+        pass  # the TTL still bounds staleness
+    # retry queued outbox messages in the background while the menu is open
+    threading.Thread(target=drain_outbox, kwargs={'quiet': True}, name='outbox', daemon=True).start()
+    while True:
+        clear_screen()
+        info = get_modem_info(modem_id)
+        tel, enabled = (None, False)
+        if info:
+            tel, enabled = info
+        print("\n--- MMCli SMS CLIENT ---")
+        print("Made by Kerso 2025")
+        print(f"Modem ID: {modem_id}")
+        print("1) Enable modem")
+        print("2) Disable modem")
+        print("3) Display telephone number")
+        print("4) Send SMS")
+        print("5) Check received SMS")
+        print("6) Search messages")
+        print("7) Watch inbox")
+        print("8) Exit")
+        choice = input("Select action (1-8): ").strip()
+        if choice == '1':
+            set_modem_enabled(modem_id, True)
+        elif choice == '2':
+            set_modem_enabled(modem_id, False)
+        elif choice == '3':
+            if tel:
+                print("Telephone number:", tel)
+            else:
+                print("Telephone number not available.")
+        elif choice == '4':
+            prompt_send_sms(modem_id)
+        elif choice == '5':
+            check_received_sms(modem_id)
+        elif choice == '6':
+            prompt_search_messages()
+        elif choice == '7':
+            prompt_watch_inbox(modem_id)
+        elif choice == '8':
+            break
+        else:
+            print("Invalid choice, try again.")
+        input("\nPress Enter to continue...")
+
+# Daemon: a length-prefixed JSON protocol on a Unix socket. Every frame is a
+# 4-byte big-endian length followed by a UTF-8 JSON object; requests carry an
+# 'op' field and every reply has 'ok' and either the result or 'error'.
+MAX_FRAME = 16 * 1024 * 1024
+
+def read_frame(f):
+    """Read one frame from a binary file object. Returns None at end of stream."""
+    header = f.read(4)
+    if len(header) < 4:
+        return None
+    size = int.from_bytes(header, 'big')
+    if size > MAX_FRAME:
+        raise ValueError(f"frame of {size} bytes is too large")
+    body = f.read(size)
+    if len(body) < size:
+        return None
+    return json.loads(body)
+
+def write_frame(f, obj):
+    body = json.dumps(obj).encode('utf-8')
+    f.write(len(body).to_bytes(4, 'big') + body)
+    f.flush()
+
+def row_dict(row):
+    return dict(row) if row is not None else None
+
+def daemon_send(req):
+    msg_id = enqueue_sms(req['tel'], req['text'], req.get('modem'))
+    return {'id': msg_id}
+
+def daemon_send_batch(req):
+    items = [(m['tel'], m['text']) if isinstance(m, dict) else tuple(m) for m in req['messages']]
+    return {'ids': enqueue_many(items, req.get('modem'))}
+
+def daemon_status(req):
+    row = query_db("SELECT id, tel, modem, state, attempts, next_attempt_at, last_error, created_at, updated_at FROM outbox WHERE id = ?;",
+                   (req['id'],), one=True)
+    if row is None:
+        raise KeyError(f"no outbox message {req['id']}")
+    return {'message': row_dict(row)}
+
+def daemon_inbox(req):
+    rows = query_db("SELECT id, number, text, timestamp, state, modem FROM messages WHERE direction = 'in' AND id > ? ORDER BY id LIMIT ?;",
+                    (req.get('since', 0), req.get('limit', 100)))
+    return {'messages': [row_dict(r) for r in rows]}
+
+def daemon_history(req):
+    """One page of history; pass the returned 'after' back to get the next page."""
+    flush_history()
+    rows = get_history_page(req.get('limit', 20), req.get('after'), req.get('search'))
+    return {'history': [row_dict(r) for r in rows], 'after': history_cursor(rows[-1]) if rows else None}
+
+daemon_ops = {
+    'ping': lambda req: {'pid': os.getpid()},
+    'send': daemon_send,
+    'send_batch': daemon_send_batch,
+    'status': daemon_status,
+    'inbox': daemon_inbox,
+    'history': daemon_history,
+    'outbox': lambda req: {'counts': outbox_counts()},
+    'stats': lambda req: {'mmcli': mmcli_stats_rows(mmcli_stats())},
+}
+
+def handle_daemon_client(conn):
+    """Answer requests on one client connection until the client hangs up."""
+    f = conn.makefile('rwb')
+    try:
+        while True:
+            try:
+                req = read_frame(f)
+            except ValueError as e:  # bad JSON or oversized frame; the stream is out of sync
+                write_frame(f, {'ok': False, 'error': str(e)})
+                return
+            if req is None:
+                return
+            op = daemon_ops.get(req.get('op')) if isinstance(req, dict) else None
+            if op is None:
+                write_frame(f, {'ok': False, 'error': f"unknown op {req.get('op') if isinstance(req, dict) else req!r}"})
+                continue
+            try:
+                reply = {'ok': True, **op(req)}
+            except (KeyError, TypeError, ValueError, sqlite3.Error) as e:
+                reply = {'ok': False, 'error': f"{type(e).__name__}: {e}"}
+            write_frame(f, reply)
+    except (BrokenPipeError, ConnectionResetError):
+        pass
+    finally:
+        f.close()
+        conn.close()
+        release_db()
+
+class DaemonClient:
+    """Persistent connection to a running daemon.
+
+        with DaemonClient() as d:
+            d.request('send', tel='+48123456789', text='hello')['id']
+    """
+
+    def __init__(self, path=None):
+        import socket
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(path or daemon_socket)
+        self.file = self.sock.makefile('rwb')
+
+    def request(self, op, **fields):
+        """Send one request and return the reply. Raises RuntimeError if the daemon reports an error."""
+        write_frame(self.file, {'op': op, **fields})
+        reply = read_frame(self.file)
+        if reply is None:
+            raise ConnectionError("daemon closed the connection")
+        if not reply.get('ok'):
+            raise RuntimeError(reply.get('error'))
+        return reply
+
+    def close(self):
+        self.file.close()
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+# HTTP API (main.py serve --http PORT): the daemon ops as JSON over HTTP/1.1
+# with keep-alive. Routes are (method, path) -> (daemon op, success status).
+http_routes = {
+    ('POST', '/sms'): (daemon_send, 202),
+    ('POST', '/sms/batch'): (daemon_send_batch, 202),
+    ('GET', '/inbox'): (daemon_inbox, 200),
+    ('GET', '/history'): (daemon_history, 200),
+    ('GET', '/outbox'): (daemon_ops['outbox'], 200),
+}
+http_reasons = {200: 'OK', 202: 'Accepted', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 413: 'Payload Too Large'}
+
+def http_request_fields(method, target, body):
+    """Turn the query string (GET) or JSON body (POST) into daemon request fields."""
+    path, _, query = target.partition('?')
+    if method == 'POST':
+        return path, json.loads(body) if body else {}
+    import urllib.parse
+    fields = {k: v[-1] for k, v in urllib.parse.parse_qs(query).items()}
+    for key in ('since', 'limit', 'id'):
+        if key in fields:
+            fields[key] = int(fields[key])
+    if 'after' in fields:
+        fields['after'] = json.loads(fields['after'])
+    return path, fields
+
+def http_dispatch(method, target, body):
+    """Return (status, reply) for one request."""
+    try:
+        path, fields = http_request_fields(method, target, body)
+    except ValueError as e:
+        return 400, {'ok': False, 'error': f"bad request: {e}"}
+    route = http_routes.get((method, path))
+    if route is None and method == 'GET' and path.startswith('/sms/') and path[5:].isdigit():
+        route, fields = (daemon_status, 200), {'id': int(path[5:])}
+    if route is None:
+        if path.startswith('/sms/') or any(p == path for _, p in http_routes):
+            return 405, {'ok': False, 'error': f"{method} not allowed on {path}"}
+        return 404, {'ok': False, 'error': f"no route for {path}"}
+    op, status = route
+    if not isinstance(fields, dict):
+        return 400, {'ok': False, 'error': "expected a JSON object"}
+    try:
+        return status, {'ok': True, **op(fields)}
+    except KeyError as e:
+        if op is daemon_status:
+            return 404, {'ok': False, 'error': e.args[0]}
+        return 400, {'ok': False, 'error': f"missing field {e}"}
+    except (TypeError, ValueError, sqlite3.Error) as e:
+        return 400, {'ok': False, 'error': f"{type(e).__name__}: {e}"}
+
+async def handle_http(reader, writer):
+    """Serve HTTP requests on one connection until the client closes it."""
+    import asyncio
+    loop = asyncio.get_running_loop()
+    try:
+        while True:
+            request_line = await reader.readline()
+            if not request_line:
+                break
+            try:
+                method, target, version = request_line.decode('latin-1').split()
+            except ValueError:
+                break
+            headers = {}
+            while (line := await reader.readline()) not in (b'\r\n', b'\n', b''):
+                name, _, value = line.decode('latin-1').partition(':')
+                headers[name.strip().lower()] = value.strip()
+            try:
+                length = int(headers.get('content-length', 0))
+            except ValueError:
+                length = -1
+            if length < 0:
+                status, reply = 400, {'ok': False, 'error': "invalid Content-Length"}
+                keep_alive = False
+            elif length > MAX_FRAME:
+                status, reply = 413, {'ok': False, 'error': "request body too large"}
+                keep_alive = False
+            else:
+                body = await reader.readexactly(length) if length else b''
+                # sqlite calls run in the default executor, whose threads keep their connections
+                status, reply = await loop.run_in_executor(None, http_dispatch, method, target, body)
+                keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+            payload = json.dumps(reply).encode('utf-8')
+            writer.write(f"HTTP/1.1 {status} {http_reasons[status]}\r\nContent-Type: application/json\r\n"
+                         f"Content-Length: {len(payload)}\r\nConnection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+                         .encode('latin-1') + payload)
+            await writer.drain()
+            if not keep_alive:
+                break
+    except (asyncio.IncompleteReadError, ConnectionResetError, BrokenPipeError, ValueError):
+        pass
+    finally:
+        writer.close()
+
+def start_http_server(port, host='127.0.0.1'):
+    """Run the HTTP API on its own event loop thread. Returns (thread, stop function).
+
+    Raises OSError when the port cannot be bound.
+    """
+    import asyncio
+    loop = asyncio.new_event_loop()
+    started = threading.Event()
+    server = error = None
+
+    async def start():
+        nonlocal server
+        server = await asyncio.start_server(handle_http, host, port)
+
+    def run():
+        nonlocal error
+        try:
+            loop.run_until_complete(start())
+        except OSError as e:
+            error = e
+            loop.close()
+            return
+        finally:
+            started.set()
+        loop.run_forever()
+        server.close()
+        loop.run_until_complete(server.wait_closed())
+        loop.close()
+
+    thread = threading.Thread(target=run, name='http', daemon=True)
+    thread.start()
+    started.wait()
+    if error:
+        raise error
+    return thread, lambda: loop.call_soon_threadsafe(loop.stop)
+
+def remove_stale_socket(path):
+    """Remove a socket file left by a daemon that is no longer running. Raises if one is."""
+    import socket
+    if not os.path.exists(path):
+        return
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(path)
+    except (ConnectionRefusedError, FileNotFoundError):
+        os.unlink(path)
+        return
+    finally:
+        probe.close()
+    raise RuntimeError(f"a daemon is already listening on {path}")
+
+def serve(path=None, workers=None, watch=True, http_port=None):
+    """Run the daemon until interrupted: socket API, optional HTTP API, outbox workers and inbox watchers.
+
+    Messages received over the socket are only queued, so a send request
+    returns as soon as the outbox row is committed; the workers send it.
+    Each client connection gets its own thread.
+    """
+    import signal
+    import socket
+    path = path or daemon_socket
+    remove_stale_socket(path)
+    http_port = http_port or daemon_http_port
+    if http_port:
+        try:
+            http_thread, stop_http = start_http_server(http_port)
+        except OSError as e:
+            raise RuntimeError(f"cannot serve HTTP on port {http_port}: {e}") from e
+    recovered = recover_outbox(force=True)
+    if recovered:
+        print(f"Recovered {recovered} interrupted message(s).")
+    stop = threading.Event()
+    drainer = threading.Thread(target=drain_outbox, args=(workers or daemon_workers, stop),
+                               kwargs={'quiet': True}, name='outbox', daemon=True)
+    drainer.start()
+    watchers = []
+    if watch:
+        try:
+            for modem_id in get_backend().list_modems():
+                watch_modem_status(modem_id)
+                check_received_sms(modem_id)
+                watchers.append(watch_inbox(modem_id))
+        except ModemError as e:
+            print_modem_error(e)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(path)
+    os.chmod(path, 0o660)
+    server.listen(64)
+    if http_port:
+        print(f"HTTP API on http://127.0.0.1:{http_port}/", flush=True)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    print(f"Listening on {path}", flush=True)
+    try:
+        while True:
+            conn, _ = server.accept()
+            threading.Thread(target=handle_daemon_client, args=(conn,), name='client', daemon=True).start()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        os.unlink(path)
+        if http_port:
+            stop_http()
+            http_thread.join()
+        for w in watchers:
+            if w:
+                w.stop()
+        stop.set()
+        drainer.join()
+
+# Non-interactive commands. Each prints one line per result, a JSON object
+# per line with --json, and returns the exit status.
+def emit(args, obj, text):
+    print(json.dumps(obj, ensure_ascii=False) if args.json else text, flush=True)
+
+def modem_ids(args):
+    """The modem given with --modem, or every modem. Raises ModemError."""
+    return [args.modem] if args.modem else get_backend().list_modems()
+
+def send_results(args, ids, worker):
+    """Send outbox messages claimed by worker now and report each. Returns the exit status."""
+    failed = 0
+    lock = threading.Lock()
+
+    def report(row, error):
+        nonlocal failed
+        state = 'sent' if error is None else outbox_state(row['id'])
+        with lock:
+            failed += error is not None
+            text = f"#{row['id']} {row['tel']}: " + ("sent" if error is None else f"{state} ({error})")
+            emit(args, {'id': row['id'], 'tel': row['tel'], 'state': state, 'error': error}, text)
+
+    send_claimed(ids, worker, args.workers, report)
+    return 1 if failed else 0
+
+# claimed on insert, so a running daemon or `outbox drain` can't take them
+# before they are sent and reported here
+def cli_send(args):
+    worker = outbox_worker_id()
+    return send_results(args, [enqueue_sms(args.tel, args.text, args.modem, worker)], worker)
+
+def cli_send_batch(args):
+    worker = outbox_worker_id()
+    f = sys.stdin if args.file == '-' else open(args.file, newline='', encoding='utf-8')
+    with f:
+        ids = enqueue_many(read_bulk_file(f), args.modem, worker)
+    return send_results(args, ids, worker)
+
+def cli_inbox(args):
+    status = 0
+    try:
+        ids = modem_ids(args)
+    except ModemError as e:
+        emit(args, {'error': str(e)}, f"Error listing modems: {e}")
+        return 1
+    for modem_id in ids:
+        try:
+            received, unreadable = fetch_received_sms(modem_id)
+        except ModemError as e:
+            emit(args, {'modem': modem_id, 'error': str(e)}, f"Error listing SMS: {e}")
+            status = 1
+            continue
+        for p, raw in unreadable:
+            print(f"Failed to read SMS {p}: {raw}", file=sys.stderr)
+        for m in received:
+            emit(args, {'modem': modem_id, **{k: v for k, v in m.items() if k != 'raw'}},
+                 f"From: {m['number'] or 'unknown'}  Time: {m['timestamp'] or 'unknown'}\n   Text: {m['text'] or '[no text parsed]'}")
+    return status
+
+def cli_history(args):
+    rows = iter_history(search=args.search)
+    for row in itertools.islice(rows, args.limit or None):
+        emit(args, {'tel': row['tel'], 'last_message': row['last_message'], 'send_count': row['send_count']},
+             f"{row['tel']:<16} {row['last_message']}  ({row['send_count']} sent)")
+    return 0
+
+def cli_modem(args):
+    status = 0
+    try:
+        ids = modem_ids(args)
+    except ModemError as e:
+        emit(args, {'error': str(e)}, f"Error listing modems: {e}")
+        return 1
+    backend = get_backend()
+    for modem_id in ids:
+        try:
+            if args.action == 'info':
+                info = backend.modem_info(modem_id)
+                emit(args, {'modem': modem_id, **info},
+                     f"Modem {modem_id}: {info['state']}, number {', '.join(info['own_numbers']) or 'unknown'}, signal {info['signal_quality']}")
+            else:
+                backend.set_enabled(modem_id, args.action == 'enable')
+                emit(args, {'modem': modem_id, 'state': args.action + 'd'}, f"Modem {modem_id} {args.action}d.")
+        except ModemError as e:
+            emit(args, {'modem': modem_id, 'error': str(e)}, f"Error on modem {modem_id}: {e}")
+            status = 1
+        finally:
+            if args.action != 'info':
+                invalidate_modem_status(modem_id)
+    return status
+
+def cli_stats(args):
+    if args.reset:
+        for p in (mmcli_stats_path(), mmcli_stats_path() + '.lock'):
+            if os.path.exists(p):
+                os.unlink(p)
+        return 0
+    if args.daemon:
+        try:
+            with DaemonClient() as d:
+                rows = d.request('stats')['mmcli']
+        except (OSError, RuntimeError) as e:
+            emit(args, {'error': str(e)}, f"Cannot reach the daemon at {daemon_socket}: {e}")
+            return 1
+    else:
+        rows = mmcli_stats_rows(mmcli_stats(saved=True))
+    if not args.json:
+        print(f"{'operation':<10} {'calls':>7} {'errors':>6} {'mean ms':>9} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'max ms':>9} {'out':>7}")
+    for r in rows:
+        emit(args, r, f"{r['op']:<10} {r['calls']:7d} {r['errors']:6d} {r['mean_ms']:9.2f} {r['p50_ms']:9.2f} "
+                      f"{r['p90_ms']:9.2f} {r['p99_ms']:9.2f} {r['max_ms']:9.2f} {r['stdout_size_avg']:7.0f}")
+    return 0
+
+cli_commands = {'stats': cli_stats, 'send': cli_send, 'send-batch': cli_send_batch, 'inbox': cli_inbox, 'history': cli_history, 'modem': cli_modem}
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description="Send and receive SMS through ModemManager. Without a command, starts the interactive menu.")
+    commands = parser.add_subparsers(dest='command')
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--json', action='store_true', help='print one JSON object per line')
+    common.add_argument('--modem', help='modem id (default: every modem, or the pool for sending)')
+    send = commands.add_parser('send', parents=[common], help='send one SMS')
+    send.add_argument('tel')
+    send.add_argument('text')
+    send_batch = commands.add_parser('send-batch', parents=[common], help="send every 'number,text' line of a CSV file ('-' for stdin) through the outbox")
+    send_batch.add_argument('file')
+    for p in (send, send_batch):
+        p.add_argument('--workers', type=int, default=1 if p is send else bulk_workers)
+    commands.add_parser('inbox', parents=[common], help='fetch and print new received SMS')
+    history = commands.add_parser('history', parents=[common], help='print numbers from the history, most recent first')
+    history.add_argument('--limit', type=int, default=20, help='0 prints all')
+    history.add_argument('--search')
+    modem = commands.add_parser('modem', parents=[common], help='enable, disable or describe modems')
+    modem.add_argument('action', choices=['enable', 'disable', 'info'])
+    stats = commands.add_parser('stats', help='show mmcli call latency per operation')
+    stats.add_argument('--json', action='store_true', help='print one JSON object per line')
+    stats.add_argument('--daemon', action='store_true', help="ask the running daemon for its statistics")
+    stats.add_argument('--reset', action='store_true', help='delete the saved statistics')
+    bulk = commands.add_parser('bulk', help="send every 'number,text' line of a CSV file ('-' for stdin)")
+    bulk.add_argument('file')
+    bulk.add_argument('--workers', type=int, default=bulk_workers)
+    bulk.add_argument('--modem-rate', type=float, default=bulk_modem_rate, help='messages per second per modem')
+    bulk.add_argument('--carrier-rate', type=float, default=bulk_carrier_rate, help='messages per second per carrier')
+    bulk.add_argument('--pipeline', action='store_true', help='create SMS ahead of sending them, one pipeline per modem')
+    bulk.add_argument('--depth', type=int, default=pipeline_depth, help='SMS created ahead per modem with --pipeline')
+    outbox = commands.add_parser('outbox', help='send queued messages, or show outbox counts')
+    outbox.add_argument('action', choices=['drain', 'status'])
+    outbox.add_argument('--workers', type=int, default=1)
+    outbox.add_argument('--forever', action='store_true', help='keep waiting for new messages when the outbox is empty')
+    serve_parser = commands.add_parser('serve', help='run as a daemon accepting requests on a Unix socket')
+    serve_parser.add_argument('--socket', default=daemon_socket)
+    serve_parser.add_argument('--workers', type=int, default=daemon_workers, help='outbox worker threads')
+    serve_parser.add_argument('--http', type=int, metavar='PORT', default=daemon_http_port, help='also serve the HTTP API on 127.0.0.1:PORT')
+    args = parser.parse_args(argv)
+
+    init_db(interactive=args.command is None)
+    if args.command in cli_commands:
+        return cli_commands[args.command](args)
+    # long-running paths export metrics when MMCLISMS_METRICS_PORT/FILE are set
+    start_metrics_exporter()
+    if args.command == 'serve':
+        try:
+            serve(args.socket, args.workers, http_port=args.http)
+        except RuntimeError as e:
+            print(e)
+            return 1
+        return 0
+    if args.command == 'outbox':
+        if args.action == 'status':
+            for state, n in sorted(outbox_counts().items()):
+                print(f"{state}: {n}")
+            return 0
+        recovered = recover_outbox(force=True)
+        if recovered:
+            print(f"Recovered {recovered} interrupted message(s).")
+        try:
+            drain_outbox(args.workers, until_empty=not args.forever)
+        except KeyboardInterrupt:
+            pass
+        return 0
+    if args.command == 'bulk':
+        f = sys.stdin if args.file == '-' else open(args.file, newline='', encoding='utf-8')
+        with f:
+            if args.pipeline:
+                summary = send_pipelined(read_bulk_file(f), depth=args.depth, modem_rate=args.modem_rate)
+            else:
+                summary = send_bulk(read_bulk_file(f), args.workers, args.modem_rate, args.carrier_rate)
+        print_bulk_summary(summary)
+        if args.pipeline:
+            print_pipeline_metrics(summary['pipelines'])
+        return 0 if summary['failed'] == 0 else 1
+    interactive_menu()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
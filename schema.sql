@@ -1,9 +1,70 @@
 -- SqLite3 schema for storing sms messaging history
 -- ofc without any personal data
 
+-- one row per number, updated on every send
 CREATE TABLE IF NOT EXISTS history (
-    id SERIAL PRIMARY KEY,
-    tel VARCHAR(15) NOT NULL,
-    last_message TIMESTAMP NOT NULL
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    tel VARCHAR(30) NOT NULL,
+    last_message TIMESTAMP NOT NULL,
+    send_count INTEGER NOT NULL DEFAULT 1
 );
+CREATE UNIQUE INDEX IF NOT EXISTS history_tel ON history (tel);
+CREATE INDEX IF NOT EXISTS history_last_message ON history (last_message);
 
+-- sent ('out') and received ('in') messages
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    direction VARCHAR(3) NOT NULL,
+    number VARCHAR(30),
+    text TEXT,
+    timestamp TIMESTAMP NOT NULL,
+    state VARCHAR(20),
+    modem VARCHAR(20),
+    path VARCHAR(80)
+);
+CREATE UNIQUE INDEX IF NOT EXISTS messages_path ON messages (direction, modem, path, timestamp);
+-- received messages are unique by content: ModemManager renumbers modems and SMS when it restarts
+CREATE UNIQUE INDEX IF NOT EXISTS messages_received ON messages (IFNULL(number, ''), timestamp, IFNULL(text, '')) WHERE direction = 'in';
+CREATE INDEX IF NOT EXISTS messages_timestamp ON messages (timestamp);
+CREATE INDEX IF NOT EXISTS messages_number ON messages (number, timestamp);
+
+-- SMS paths already read from each modem, so inbox checks only read new ones
+CREATE TABLE IF NOT EXISTS sms_seen (
+    modem VARCHAR(20) NOT NULL,
+    path VARCHAR(80) NOT NULL,
+    ingested_at TIMESTAMP NOT NULL,
+    run VARCHAR(80), -- ModemManager instance that listed the path; paths of an earlier run are read again
+    PRIMARY KEY (modem, path)
+);
+
+-- durable queue of outgoing messages: queued -> creating -> sending -> sent (or failed);
+-- times are unix seconds, lease_owner/lease_until mark the worker sending it
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    tel VARCHAR(30) NOT NULL,
+    text TEXT NOT NULL,
+    modem VARCHAR(20),
+    state VARCHAR(10) NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    lease_owner VARCHAR(80),
+    lease_until REAL,
+    sms_path VARCHAR(80),
+    last_error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS outbox_due ON outbox (state, next_attempt_at);
+
+-- full-text index over message text (needs FTS5)
+CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(text, content='messages', content_rowid='id');
+CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN
+    INSERT INTO messages_fts (rowid, text) VALUES (new.id, new.text);
+END;
+CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN
+    INSERT INTO messages_fts (messages_fts, rowid, text) VALUES ('delete', old.id, old.text);
+END;
+CREATE TRIGGER IF NOT EXISTS messages_fts_update AFTER UPDATE OF text ON messages BEGIN
+    INSERT INTO messages_fts (messages_fts, rowid, text) VALUES ('delete', old.id, old.text);
+    INSERT INTO messages_fts (rowid, text) VALUES (new.id, new.text);
+END;